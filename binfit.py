@@ -0,0 +1,252 @@
+import os
+import multiprocessing
+import numpy as np
+import individual
+import chains
+import results
+
+"""
+
+Fit the luminosity function in many redshift bins in parallel.
+
+fit_bins takes a list of bins and an individual.registry holding the
+surveys, and fits each bin (bestfit followed by run_mcmc) in a pool
+of worker processes.  The workers are forked after the registry has
+been read, so they share it instead of reading or receiving the data
+again.  The work per bin grows with the number of quasars in it, and
+the z < 2.2 SDSS bins are much heavier than the z ~ 6 bins.  Bins are
+therefore queued heaviest first, and each free worker takes the next
+one.  With at least as many workers as bins, a sweep then takes about
+as long as its slowest bin.
+
+In warm-start mode neighbouring bins are instead fitted in sequence,
+each starting from the posterior of the one before; see fit_bins.
+
+Results come back as a structured array with one row per bin (see
+result_dtype), together with the fitted lf objects, both sorted by
+redshift.  Given a results.store, each worker also writes the record
+of its bin as soon as the bin is done.
+
+"""
+
+# One row of fit_bins output; see results.fit_dtype.
+result_dtype = results.fit_dtype
+
+def set_priors(lfi, zlims):
+
+    """Set the prior ranges used for the bin zlims."""
+
+    zmin, zmax = zlims
+
+    if zmin < 0.3:
+        lfi.prior_min_values = np.array([-14.0, -32.0, -7.0, -10.0])
+    else:
+        lfi.prior_min_values = np.array([-14.0, -32.0, -7.0, -4.0])
+
+    if zmin > 5.4:
+        # Special priors for z = 6 data.
+        lfi.prior_max_values = np.array([-4.0, -20.0, -4.0, 0.0])
+
+        # Change result of optimize.minimize so that emcee works.
+        lfi.bf.x[2] = -5.0
+    elif zmin < 0.3:
+        lfi.prior_max_values = np.array([-1.0, -15.0, 0.0, 15.0])
+    else:
+        lfi.prior_max_values = np.array([-4.0, -20.0, 0.0, 0.0])
+
+    assert(np.all(lfi.prior_min_values < lfi.prior_max_values))
+
+    return
+
+def warm_walkers(lfi, samples, nwalkers=100):
+
+    """Initial walkers for lfi drawn from the posterior samples of another bin.
+
+    The draws are shifted by the difference of the two best fits, so
+    that they keep the shape of the neighbouring posterior but are
+    centred on this bin's.  Draws outside this bin's prior are
+    replaced by the usual small ball around lfi.bf.x.
+
+    """
+
+    draws = samples[np.random.randint(len(samples), size=nwalkers)]
+    pos = draws - np.median(samples, axis=0) + lfi.bf.x
+
+    ball = lfi.bf.x + 1e-4*np.random.randn(nwalkers, lfi.bf.x.size)
+    outside = ~np.isfinite(lfi.lnprob_batch(pos))
+    pos[outside] = ball[outside]
+
+    return pos
+
+def fit_bin(reg, zlims, method='L-BFGS-B', num_runs=20000, neff=5000,
+            start=None):
+
+    """Fit one redshift bin; returns its individual.lf.
+
+    If start, the fitted lf of a neighbouring bin, is given, the
+    optimiser starts from its best fit and the walkers are drawn from
+    its posterior (see warm_walkers).
+
+    """
+
+    lfi = individual.lf(registry=reg, zlims=zlims)
+
+    print('z = {:s}: {:d} quasars.'.format(str(zlims), lfi.z.size))
+
+    if start is None:
+        g = (np.log10(1.e-6), -25.0, -3.0, -1.5)
+    else:
+        g = np.median(start.samples, axis=0)
+    lfi.bestfit(g, method=method)
+
+    set_priors(lfi, zlims)
+
+    pos = None
+    if start is not None:
+        pos = warm_walkers(lfi, start.samples)
+
+    lfi.warm = start is not None
+    lfi.run_mcmc(num_runs=num_runs, neff=neff, pos=pos)
+    lfi.get_percentiles()
+
+    return lfi
+
+def summary(lfi):
+
+    """One row of result_dtype for a fitted lf."""
+
+    row = np.zeros((), dtype=result_dtype)
+
+    row['z'] = lfi.z.mean()
+    row['zmin'], row['zmax'] = lfi.zlims
+    row['nqso'] = lfi.z.size
+    row['bestfit'] = lfi.bf.x
+    row['phi_star'] = lfi.phi_star
+    row['M_star'] = lfi.M_star
+    row['alpha'] = lfi.alpha
+    row['beta'] = lfi.beta
+    row['nsteps'] = lfi.sampler.iteration
+    row['nfev'] = lfi.bf.nfev
+    row['warm'] = getattr(lfi, 'warm', False)
+
+    try:
+        row['tau'] = lfi.tau
+        row['converged'] = lfi.converged
+    except(AttributeError):
+        # Fixed-length run (neff=None).
+        row['tau'] = np.nan
+        row['converged'] = False
+
+    return row
+
+# Registry and fit options of the current fit_bins call, inherited by
+# its workers when they are forked.
+_shared = {}
+
+def _fit(job):
+
+    """Fit a run of bins, each warm-started from the one before if
+    the fit is warm-started, and otherwise independently."""
+
+    done = []
+    start = None
+
+    for zlims, seed in job:
+
+        # Each bin has its own seed, so that the results do not depend
+        # on the worker or order in which the bins are fitted.
+        np.random.seed(seed)
+
+        lfi = fit_bin(_shared['registry'], zlims, start=start,
+                      **_shared['options'])
+        row = summary(lfi)
+
+        if _shared['store'] is not None:
+            _shared['store'].put(_shared['model'], row)
+
+        if _shared['warm_start']:
+            start = lfi
+
+        done.append((row, lfi))
+
+    # Send back the chains but not the samplers, which hold the pool
+    # and the log-probability function.
+    for row, lfi in done:
+        lfi.sampler = chains.in_memory(lfi.sampler)
+
+    return done
+
+def contiguous_runs(weights, nruns):
+
+    """Split range(len(weights)) into nruns contiguous runs of similar total weight."""
+
+    edges = np.cumsum(weights)
+    targets = edges[-1]*np.arange(1, nruns)/nruns
+    cuts = np.unique(np.searchsorted(edges, targets, side='right'))
+    cuts = cuts[(cuts > 0) & (cuts < len(weights))]
+
+    return np.split(np.arange(len(weights)), cuts)
+
+def fit_bins(zls, reg, processes=None, store=None, model='bins',
+             warm_start=False, **options):
+
+    """Fit every bin in zls using the surveys in the registry reg.
+
+    options are passed to fit_bin.  processes=None uses one worker
+    per bin, up to the number of CPUs; processes=1 fits the bins in
+    this process.  If store (a results.store) is given, the result of
+    each bin is written to it under the name model.
+
+    With warm_start=True, the bins are sorted by redshift and split
+    into `processes` contiguous runs of similar total quasar count.
+    Each run is fitted in order by one worker, and each bin after the
+    first of a run is started from the posterior of the bin before it
+    (see fit_bin).  processes=None then uses at most one run per two
+    bins.
+
+    Returns the results table and the list of fitted lf objects, both
+    in order of redshift.
+
+    """
+
+    if processes is None:
+        nmax = len(zls)//2 if warm_start else len(zls)
+        processes = max(1, min(nmax, os.cpu_count()))
+
+    nqso = np.array([reg.quasars(zl)[0].size for zl in zls])
+    seeds = np.random.randint(2**31, size=len(zls))
+
+    if warm_start:
+        order = np.argsort([zl[0] for zl in zls], kind='mergesort')
+        runs = [order[r] for r in contiguous_runs(nqso[order], processes)]
+    else:
+        # Heaviest bins first, so that no worker is left with a large
+        # bin at the end of the sweep.
+        runs = [[i] for i in np.argsort(nqso, kind='mergesort')[::-1]]
+
+    # Longest runs first, as for single bins.
+    runs.sort(key=lambda r: -nqso[r].sum())
+    queue = [[(zls[i], seeds[i]) for i in r] for r in runs]
+
+    _shared['registry'] = reg
+    _shared['options'] = options
+    _shared['store'] = store
+    _shared['model'] = model
+    _shared['warm_start'] = warm_start
+
+    try:
+        if processes == 1:
+            done = [_fit(job) for job in queue]
+        else:
+            context = multiprocessing.get_context('fork')
+            with context.Pool(processes) as pool:
+                done = list(pool.imap_unordered(_fit, queue, chunksize=1))
+    finally:
+        _shared.clear()
+
+    done = [x for run in done for x in run]
+    done.sort(key=lambda x: x[0]['zmin'])
+    table = np.array([row for row, lfi in done], dtype=result_dtype)
+    lfs = [lfi for row, lfi in done]
+
+    return table, lfs
@@ -5,6 +5,8 @@ import imp
 imp.reload(individual)
 from individual import lf
 import mosaic
+import binfit
+import results
 import drawlf
 
 qlumfiles = ['Data_new/dr7z2p2_sample.dat',
@@ -44,7 +46,7 @@ selnfiles = [('Selmaps_with_tiles/dr7z2p2_selfunc.dat', 6248.0, 13, r'Richards e
              ('Selmaps_with_tiles/willott10_cfhqsvwsel.dat', 494.0, 10, r'Willott et al.\ 2010'),
              ('Selmaps_with_tiles/kashikawa15_sel.dat', 6.5, 11, r'Kashikawa et al.\ 2015')]
 
-method = 'Nelder-Mead'
+method = 'L-BFGS-B'
 
 zls = [(0.1, 0.4), (0.4, 0.6), (0.6, 0.8), (0.8, 1.0), (1.0, 1.2),
        (1.2, 1.4), (1.4, 1.6), (1.6, 1.8), (1.8, 2.2), (2.2, 2.4),
@@ -52,54 +54,25 @@ zls = [(0.1, 0.4), (0.4, 0.6), (0.6, 0.8), (0.8, 1.0), (1.0, 1.2),
        (2.9, 3.0), (3.0, 3.1), (3.1, 3.2), (3.2, 3.3), (3.3, 3.4),
        (3.4, 3.5), (3.7, 4.1), (4.1, 4.7), (4.7, 5.5), (5.5, 6.5)]
 
-lfs = [] 
+# Read all surveys once; the bins are then fitted in parallel, each
+# as a slice of these.  See binfit.fit_bins.
+reg = individual.registry(quasar_files=qlumfiles, selection_maps=selnfiles)
 
-for i, zl in enumerate(zls):
+# Each bin's result is written to the results store as the bin
+# finishes; read them back with results.store().table('bins').
+WRITE_PARAMS = True
+store = results.store() if WRITE_PARAMS else None
 
-    lfi = lf(quasar_files=qlumfiles, selection_maps=selnfiles, zlims=zl)
+# Start each bin from the posterior of its neighbour; see
+# binfit.fit_bins.
+WARM_START = False
 
-    print('z =', zl)
-    print('{:d} quasars in this bin.'.format(lfi.z.size))
-    print('sids (samples): '+'  '.join(['{:2d}'.format(int(x)) for x in np.unique(lfi.sid)]))
-    print('sids (maps): '+'  '.join(['{:2d}'.format(x.sid) for x in lfi.maps]))
-    print(' ')
-    
-    g = (np.log10(1.e-6), -25.0, -3.0, -1.5)
-    b = lfi.bestfit(g, method=method)
-
-    zmin, zmax = zl 
-    
-    if zmin < 0.3:
-        lfi.prior_min_values = np.array([-14.0, -32.0, -7.0, -10.0])
-    else:
-        lfi.prior_min_values = np.array([-14.0, -32.0, -7.0, -4.0])
-
-    if zmin > 5.4:
-        # Special priors for z = 6 data.
-        lfi.prior_max_values = np.array([-4.0, -20.0, -4.0, 0.0])
-
-        # Change result of optimize.minimize so that emcee works.
-        lfi.bf.x[2] = -5.0
-    elif zmin < 0.3:
-        lfi.prior_max_values = np.array([-1.0, -15.0, 0.0, 15.0])
-    else:
-        lfi.prior_max_values = np.array([-4.0, -20.0, 0.0, 0.0])
-
-    assert(np.all(lfi.prior_min_values < lfi.prior_max_values))
-    
-    lfi.run_mcmc()
-    lfi.get_percentiles()
+# Run each bin until 5000 effective samples; see chains.run_until_converged.
+table, lfs = binfit.fit_bins(zls, reg, method=method, store=store,
+                             model='bins', warm_start=WARM_START,
+                             num_runs=20000, neff=5000)
 
+for lfi in lfs:
     drawlf.draw(lfi, show_individual_fit=True)
-    
-    WRITE_PARAMS = True
-    if WRITE_PARAMS: 
-        with open('bins.dat', 'a') as f:
-            output = ([lfi.z.mean()] + list(zl) + lfi.phi_star
-                      + lfi.M_star + lfi.alpha + lfi.beta)
-            f.write(('{:.3f}  '*len(output)).format(*output)) 
-            f.write('\n')
-    
-    lfs.append(lfi)
 
-    # mosaic.draw(lfs)
+# mosaic.draw(lfs)
@@ -2,6 +2,8 @@ import sys
 import numpy as np
 from individual_mockData import lf
 import mosaic
+import binfit
+import results
 
 qlumfiles = ['Data_new/dr7z2p2_sample.dat',
              'Data_new/croom09sgp_sample.dat',
@@ -101,25 +103,7 @@ def bins(composite):
 
         write=False
         if write: 
-            with open('phi_star_fineBins.dat', 'a') as f:
-                f.write(('{:.3f} '*6).format(lfi.z.mean(), zl[0], zl[1],
-                                             lfi.phi_star[0], lfi.phi_star[1], lfi.phi_star[2]))
-                f.write('\n')
-
-            with open('M_star_fineBins.dat', 'a') as f:
-                f.write(('{:.3f} '*6).format(lfi.z.mean(), zl[0], zl[1],
-                                             lfi.M_star[0], lfi.M_star[1], lfi.M_star[2]))
-                f.write('\n')
-
-            with open('alpha_fineBins.dat', 'a') as f:
-                f.write(('{:.3f} '*6).format(lfi.z.mean(), zl[0], zl[1],
-                                             lfi.alpha[0], lfi.alpha[1], lfi.alpha[2]))
-                f.write('\n')
-
-            with open('beta_fineBins.dat', 'a') as f:
-                f.write(('{:.3f} '*6).format(lfi.z.mean(), zl[0], zl[1],
-                                             lfi.beta[0], lfi.beta[1], lfi.beta[2]))
-                f.write('\n')
+            results.store().put('fineBins', binfit.summary(lfi))
 
         lfs.append(lfi)
 
@@ -1,6 +1,13 @@
 import numpy as np
+import results
 
-zmean, zmin, zmax, phil, phiu, phic, ml, mu, mc, al, au, ac, bl, bu, bc = np.loadtxt('bins.dat', unpack=True)
+t = results.load('bins')
+
+zmean, zmin, zmax = t['z'], t['zmin'], t['zmax']
+phil, phiu, phic = t['phi_star'].T
+ml, mu, mc = t['M_star'].T
+al, au, ac = t['alpha'].T
+bl, bu, bc = t['beta'].T
 zbin = (zmin+zmax)/2.0
 
 phi_uperr = phiu-phic
@@ -5,6 +5,8 @@ import imp
 imp.reload(individual)
 from individual import lf
 import mosaic
+import binfit
+import results
 
 qlumfiles = ['Data_new/dr7z2p2_sample.dat',
              'Data_new/croom09sgp_sample.dat',
@@ -87,11 +89,7 @@ for i, zl in enumerate(zls):
 
     WRITE_PARAMS = True
     if WRITE_PARAMS: 
-        with open('bins.dat', 'a') as f:
-            output = ([lfi.z.mean()] + list(zl) + lfi.phi_star
-                      + lfi.M_star + lfi.alpha + lfi.beta)
-            f.write(('{:.3f}  '*len(output)).format(*output)) 
-            f.write('\n')
+        results.store().put('bins_withg', binfit.summary(lfi))
     
     lfs.append(lfi)
 
@@ -10,6 +10,7 @@ from astropy.stats import knuth_bin_width  as kbw
 from astropy.stats import poisson_conf_interval as pci
 from scipy.stats import binned_statistic as bs
 import cosmolopy.distance as cd
+import catalogue
 cosmo = {'omega_M_0':0.3,
          'omega_lambda_0':0.7,
          'omega_k_0':0.0,
@@ -55,7 +56,7 @@ def binvol(m, zrange, bins, msel, psel, vsel, zsel, totv):
 
 def get_lf(zrange, bins):
 
-    z, m, p = np.loadtxt('Data/r13miz2_sample.dat', usecols=(1, 2, 3), unpack=True)
+    z, m, p = catalogue.loadcols('Data/r13miz2_sample.dat', (1, 2, 3))
     select = ((z>=zrange[0]) & (z<zrange[1]))
     m = m[select]
     p = p[select]
@@ -63,10 +64,10 @@ def get_lf(zrange, bins):
     area = 2236.0 # deg^2
     dz = 0.05 
     dm = 0.1
-    zsel, msel, psel = np.loadtxt('Data/r13miz2_selfunc.dat', usecols=(1,2,3), unpack=True)
+    zsel, msel, psel = catalogue.loadcols('Data/r13miz2_selfunc.dat', (1,2,3))
     vol = volume(zsel, area)*dz
 
-    psel[(zsel < zrange[0]) | (zsel >= zrange[1])] = 0.0
+    psel = np.where((zsel < zrange[0]) | (zsel >= zrange[1]), 0.0, psel)
 
     zv = np.linspace(zrange[0], zrange[1], 50)
     dzv = np.diff(zv)[0]
@@ -0,0 +1,149 @@
+import os
+import hashlib
+import numpy as np
+
+"""
+
+Binary cache for the ASCII quasar catalogues and selection maps.
+
+The first time a table is read, the requested columns are parsed with
+np.loadtxt and written to a .npy file in CACHE_DIR whose name contains
+a hash of the table's contents.  Later reads memory-map that file
+instead of parsing the text again.  Editing a table changes its hash,
+so stale caches are never used; they can be deleted at any time.
+
+"""
+
+CACHE_DIR = os.environ.get('QLF_CACHE_DIR',
+                           os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                        'cache'))
+
+# Columns of the Data_new/*_sample.dat files: z, M1450, p, area, sample.
+SAMPLE_COLUMNS = (1, 2, 3, 4, 5)
+
+# Columns of the Selmaps_with_tiles/*.dat files: z, M1450, p, dz, dmag.
+SELFN_COLUMNS = (1, 2, 3, 4, 5)
+
+# Tables already opened by this process, keyed on (path, mtime, size,
+# usecols), so that repeated reads do not even rehash the file.
+_opened = {}
+
+def file_hash(filename):
+
+    """Return the SHA-1 hex digest of the contents of filename."""
+
+    h = hashlib.sha1()
+    with open(filename, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+
+    return h.hexdigest()
+
+def cache_file(filename, usecols, digest):
+
+    """Name of the cache file holding columns usecols of filename."""
+
+    stem = os.path.splitext(os.path.basename(filename))[0]
+    cols = '-'.join(['{:d}'.format(c) for c in usecols])
+    name = '{:s}.{:s}.c{:s}.npy'.format(stem, digest[:16], cols)
+
+    return os.path.join(CACHE_DIR, name)
+
+def build_cache(filename, usecols, cachefile):
+
+    """Parse filename and write its columns to cachefile."""
+
+    data = np.loadtxt(filename, usecols=usecols, ndmin=2)
+
+    # Store column-major so that each column is contiguous on disk.
+    data = np.ascontiguousarray(data.T)
+
+    if not os.path.isdir(CACHE_DIR):
+        os.makedirs(CACHE_DIR, exist_ok=True)
+
+    # Write to a temporary name and rename, so that concurrent
+    # processes never see a partially written cache file.
+    tmpfile = '{:s}.{:d}.tmp'.format(cachefile, os.getpid())
+    with open(tmpfile, 'wb') as f:
+        np.save(f, data)
+    os.replace(tmpfile, cachefile)
+
+    return
+
+def loadcols(filename, usecols):
+
+    """Read columns usecols of an ASCII table through the binary cache.
+
+    Returns a tuple with one read-only 1D array per requested column,
+    in the same order as usecols, like np.loadtxt(..., unpack=True)
+    would.  The arrays are views into a memory-mapped file, so callers
+    that modify them in place must copy them first.
+
+    """
+
+    usecols = tuple(usecols)
+    st = os.stat(filename)
+    key = (os.path.abspath(filename), st.st_mtime, st.st_size, usecols)
+
+    try:
+        data = _opened[key]
+    except(KeyError):
+        cachefile = cache_file(filename, usecols, file_hash(filename))
+        if not os.path.exists(cachefile):
+            build_cache(filename, usecols, cachefile)
+        data = np.asarray(np.load(cachefile, mmap_mode='r'))
+        _opened[key] = data
+
+    return tuple(data)
+
+def read_mask(filename, cut, sid):
+
+    """Read the mask of cut (a cuts.cutset) for a table, through the cache.
+
+    The table can be a quasar sample or a selection map; in both cases
+    columns 1 and 2 are z and M1450.  The mask is cached next to the
+    table's columns, keyed on the table's contents and cut.digest.
+
+    """
+
+    st = os.stat(filename)
+    key = (os.path.abspath(filename), st.st_mtime, st.st_size,
+           cut.digest, sid)
+
+    try:
+        return _opened[key]
+    except(KeyError):
+        pass
+
+    digest = file_hash(filename)
+    stem = os.path.splitext(os.path.basename(filename))[0]
+    name = '{:s}.{:s}.m{:s}.s{:g}.npy'.format(stem, digest[:16],
+                                               cut.digest[:16], sid)
+    cachefile = os.path.join(CACHE_DIR, name)
+
+    if not os.path.exists(cachefile):
+        z, mag = loadcols(filename, (1, 2))
+        mask = cut.mask(z, mag, sid)
+        if not os.path.isdir(CACHE_DIR):
+            os.makedirs(CACHE_DIR, exist_ok=True)
+        tmpfile = '{:s}.{:d}.tmp'.format(cachefile, os.getpid())
+        with open(tmpfile, 'wb') as f:
+            np.save(f, mask)
+        os.replace(tmpfile, cachefile)
+
+    mask = np.asarray(np.load(cachefile, mmap_mode='r'))
+    _opened[key] = mask
+
+    return mask
+
+def read_sample(lumfile):
+
+    """Read z, M1450, p, area and sample id of a quasar sample."""
+
+    return loadcols(lumfile, SAMPLE_COLUMNS)
+
+def read_selfn(selfile):
+
+    """Read z, M1450, p, dz and dmag of a selection map."""
+
+    return loadcols(selfile, SELFN_COLUMNS)
@@ -0,0 +1,283 @@
+import os
+import pickle
+import numpy as np
+from emcee.backends import Backend
+
+"""
+
+On-disk chain storage for emcee.
+
+A chainfile is an emcee backend that appends the walker positions and
+log-probabilities of each step to a binary file instead of keeping
+the chain in memory.  Steps are buffered and written every `chunk`
+steps, so memory use does not grow with the length of the run.  The
+file has a 32-byte header (magic, nwalkers, ndim) followed by one
+record per step of nwalkers rows of ndim+1 float64 numbers: the
+position of a walker followed by its log-probability.
+
+The acceptance counts and the state of the sampler's random number
+generator are written, after each chunk, to <filename>.state.  A run
+that is killed can then be continued from the last written step:
+
+    backend = chains.chainfile('chain.bin', resume=True)
+    sampler = emcee.EnsembleSampler(nwalkers, ndim, lnprob, backend=backend)
+    sampler.run_mcmc(None if backend.iteration else pos,
+                     nsteps - backend.iteration)
+    backend.close()
+
+Resumed runs reproduce the steps of an uninterrupted run with the same
+seed.  Blobs are not supported.
+
+in_memory copies a chain, from either kind of backend, into memory.
+run_until_converged runs any sampler until the chain holds a target
+number of effective samples, judged from the integrated
+autocorrelation time.
+
+"""
+
+MAGIC = b'QLFCHN01'
+HEADER_SIZE = 32
+
+class chainfile(Backend):
+
+    def __init__(self, filename, resume=False, chunk=50):
+
+        """Open filename; with resume=True, keep the steps it has."""
+
+        super().__init__()
+
+        self.filename = filename
+        self.statefile = filename + '.state'
+        self.chunk = chunk
+        self.buffer = []
+
+        if resume and os.path.exists(self.filename):
+            self.load()
+
+        return
+
+    def load(self):
+
+        """Read the header and state of an existing chain file."""
+
+        with open(self.filename, 'rb') as f:
+            header = f.read(HEADER_SIZE)
+
+        if len(header) < HEADER_SIZE or header[:8] != MAGIC:
+            raise ValueError('{:s} is not a chain file'.format(self.filename))
+
+        nwalkers, ndim = np.frombuffer(header[8:24], dtype=np.int64)
+        self.nwalkers, self.ndim = int(nwalkers), int(ndim)
+
+        try:
+            with open(self.statefile, 'rb') as f:
+                state = pickle.load(f)
+        except(FileNotFoundError):
+            state = {'iteration': 0,
+                     'accepted': np.zeros(self.nwalkers),
+                     'random_state': None}
+
+        # Steps written after the last state update (the job was
+        # killed in between) are dropped, so that the random state
+        # matches the last step.
+        self.written = state['iteration']
+        self.accepted = state['accepted']
+        self.random_state = state['random_state']
+        with open(self.filename, 'r+b') as f:
+            f.truncate(HEADER_SIZE + self.written*self.record_size())
+
+        self.blobs = None
+        self.initialized = True
+
+        return
+
+    @property
+    def iteration(self):
+
+        """Number of saved steps, including those not yet written."""
+
+        return self.written + len(self.buffer)
+
+    def record_size(self):
+
+        return 8*self.nwalkers*(self.ndim+1)
+
+    def reset(self, nwalkers, ndim):
+
+        """Start a new, empty chain file."""
+
+        self.nwalkers = int(nwalkers)
+        self.ndim = int(ndim)
+        self.written = 0
+        self.accepted = np.zeros(self.nwalkers)
+        self.random_state = None
+        self.blobs = None
+        self.buffer = []
+
+        header = np.zeros(2, dtype=np.int64)
+        header[:] = self.nwalkers, self.ndim
+
+        with open(self.filename, 'wb') as f:
+            f.write(MAGIC + header.tobytes() + bytes(HEADER_SIZE-24))
+
+        self.write_state()
+        self.initialized = True
+
+        return
+
+    def grow(self, ngrow, blobs):
+
+        # Steps are appended to the file as they come.
+        if blobs is not None:
+            raise ValueError('chainfile does not store blobs')
+
+        return
+
+    def save_step(self, state, accepted):
+
+        self._check(state, accepted)
+
+        self.buffer.append(np.column_stack((state.coords, state.log_prob)))
+
+        self.accepted = self.accepted + accepted
+        self.random_state = state.random_state
+
+        if len(self.buffer) >= self.chunk:
+            self.flush()
+
+        return
+
+    def flush(self):
+
+        """Append buffered steps to the file and update the state."""
+
+        if len(self.buffer) == 0:
+            return
+
+        with open(self.filename, 'ab') as f:
+            for record in self.buffer:
+                f.write(record.tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+
+        self.written += len(self.buffer)
+        self.buffer = []
+        self.write_state()
+
+        return
+
+    def write_state(self):
+
+        state = {'iteration': self.written,
+                 'accepted': self.accepted,
+                 'random_state': self.random_state}
+
+        tmpfile = '{:s}.{:d}.tmp'.format(self.statefile, os.getpid())
+        with open(tmpfile, 'wb') as f:
+            pickle.dump(state, f)
+        os.replace(tmpfile, self.statefile)
+
+        return
+
+    def records(self):
+
+        """Memory-mapped (iteration, nwalkers, ndim+1) array of steps."""
+
+        self.flush()
+
+        return np.memmap(self.filename, dtype=np.float64, mode='r',
+                         offset=HEADER_SIZE,
+                         shape=(self.written, self.nwalkers, self.ndim+1))
+
+    def get_value(self, name, flat=False, thin=1, discard=0):
+
+        if self.iteration <= 0:
+            raise AttributeError('no steps have been saved')
+
+        if name == 'blobs':
+            return None
+
+        records = self.records()
+        if name == 'chain':
+            v = records[discard+thin-1::thin, :, :self.ndim]
+        elif name == 'log_prob':
+            v = records[discard+thin-1::thin, :, self.ndim]
+        else:
+            raise ValueError('unknown chain value {:s}'.format(name))
+
+        v = np.array(v)
+        if flat:
+            return v.reshape((-1,) + v.shape[2:])
+
+        return v
+
+    def close(self):
+
+        self.flush()
+
+        return
+
+    def __exit__(self, exception_type, exception_value, traceback):
+
+        self.close()
+
+        return False
+
+def in_memory(sampler):
+
+    """In-memory copy of the chain of sampler, as an emcee Backend.
+
+    Has the get_chain, get_log_prob and iteration of sampler, but
+    not its log-probability function or pool, so it can be pickled
+    and sent between processes in place of the sampler.
+
+    """
+
+    backend = Backend()
+    backend.reset(sampler.nwalkers, sampler.ndim)
+
+    backend.chain = sampler.get_chain()
+    backend.log_prob = sampler.get_log_prob()
+    backend.accepted = np.array(sampler.backend.accepted, dtype=float)
+    backend.iteration = sampler.iteration
+
+    return backend
+
+def run_until_converged(sampler, pos, neff, max_steps, check_every=100):
+
+    """Run sampler until its chain holds neff effective samples.
+
+    Every check_every steps the integrated autocorrelation time tau of
+    each parameter is estimated.  The run stops once it is longer than
+    50 tau, so that tau is reliable, and nwalkers*(steps - burnin)/tau
+    >= neff for every parameter, where burnin is 2 tau.  It also stops
+    after max_steps steps in total.  pos is the starting position, or
+    None to continue the chain already in the sampler.
+
+    Returns tau, burnin, thinning (tau/2) and whether the target was
+    reached.
+
+    """
+
+    while sampler.iteration < max_steps:
+
+        nsteps = min(check_every, max_steps - sampler.iteration)
+        sampler.run_mcmc(pos, nsteps)
+        pos = None
+
+        tau = sampler.get_autocorr_time(tol=0)
+        tau_max = np.max(tau)
+        burnin = int(np.ceil(2.0*tau_max))
+        effective = sampler.nwalkers*(sampler.iteration - burnin)/tau_max
+
+        if sampler.iteration > 50.0*tau_max and effective >= neff:
+            converged = True
+            break
+    else:
+        tau = sampler.get_autocorr_time(tol=0)
+        burnin = min(int(np.ceil(2.0*np.max(tau))), sampler.iteration//2)
+        converged = False
+
+    thin = max(1, int(0.5*np.min(tau)))
+
+    return tau, burnin, thin, converged
@@ -21,6 +21,7 @@ cosmo = {'omega_M_0':0.3,
 from drawlf import render
 from individual import lf
 import drawlf
+import dpl
 mpl.rcParams['font.size'] = '16'
 
 case = 'M1450_worseck'
@@ -130,9 +131,7 @@ def log10phi(theta, mag):
 
     log10phi_star, M_star, alpha, beta = theta 
 
-    phi = 10.0**log10phi_star / (10.0**(0.4*(alpha+1)*(mag-M_star)) +
-                                 10.0**(0.4*(beta+1)*(mag-M_star)))
-    return np.log10(phi)
+    return dpl.log10phi(mag, log10phi_star, M_star, alpha, beta)
 
 
 def croom(i, ax, zrange, yticklabels=False, xticklabels=False, nofirstylabel=True,
@@ -0,0 +1,144 @@
+import hashlib
+import numpy as np
+
+"""
+
+Survey restrictions applied to quasar samples and selection maps.
+
+Each table maps a sample id to a list of (z_min, z_max, M_bright,
+M_faint) ranges.  An object or selection-map tile is kept if, for one
+of the ranges of its sample, z_min <= z < z_max and M_bright < M1450 <=
+M_faint.  Samples that are not in a table are not restricted.  The
+same table is used for the quasars and for the selection map of a
+sample, so that the two cannot drift apart; the one deliberate
+difference is individual_map_spec below.
+
+"""
+
+inf = np.inf
+
+# Restrictions used for the fits in individual redshift bins
+# (individual.py).
+individual_spec = {
+    # Restrict Richards (SDSS) sample.
+    13: [(0.0, 0.2, -inf, -20.7),
+         (0.2, 0.4, -inf, -20.3),
+         (0.4, 0.6, -inf, -21.3),
+         (0.6, 0.8, -inf, -23.1),
+         (0.8, 1.0, -inf, -23.7),
+         (1.0, 1.2, -inf, inf),
+         (1.2, 1.4, -inf, -24.3),
+         (1.4, 1.6, -inf, inf),
+         (1.6, 1.8, -inf, -24.9),
+         (1.8, 2.2, -inf, inf),
+         (3.5, 4.7, -inf, -26.1)],
+    # Restrict Croom (2SLAQ) sample.
+    15: [(0.4, 0.6, -inf, inf),
+         (0.6, 0.8, -inf, -20.7),
+         (0.8, 1.2, -inf, -21.9),
+         (1.2, 1.8, -inf, -22.5),
+         (1.8, 2.2, -inf, -23.1)],
+    # Restrict McGreer's samples to faint quasars to avoid overlap
+    # with Yang.
+    8: [(-inf, inf, -26.73, inf)]}
+
+# Restrictions of the selection maps for the individual fits.  These
+# have always cut the Richards map at M <= -20.4 for 0.2 <= z < 0.4,
+# 0.1 mag brighter than the quasars, which keeps out tiles that
+# straddle the quasar limit.
+individual_map_spec = dict(individual_spec)
+individual_map_spec[13] = [(0.0, 0.2, -inf, -20.7),
+                           (0.2, 0.4, -inf, -20.4),
+                           (0.4, 0.6, -inf, -21.3),
+                           (0.6, 0.8, -inf, -23.1),
+                           (0.8, 1.0, -inf, -23.7),
+                           (1.0, 1.2, -inf, inf),
+                           (1.2, 1.4, -inf, -24.3),
+                           (1.4, 1.6, -inf, inf),
+                           (1.6, 1.8, -inf, -24.9),
+                           (1.8, 2.2, -inf, inf),
+                           (3.5, 4.7, -inf, -26.1)]
+
+# Restrictions used for the global models (composite.py).  These
+# exclude the z < 0.6 Richards and Croom data, which are affected by
+# host-galaxy contamination.
+composite_spec = {
+    # Restrict Richards (SDSS) sample.
+    13: [(0.6, 0.8, -inf, -23.1),
+         (0.8, 1.0, -inf, -23.7),
+         (1.0, 1.2, -inf, inf),
+         (1.2, 1.4, -inf, -24.3),
+         (1.4, 1.6, -inf, inf),
+         (1.6, 1.8, -inf, -24.9),
+         (1.8, 2.2, -inf, inf),
+         (3.5, 4.7, -inf, -26.1)],
+    # Restrict Croom (2SLAQ) sample.
+    15: [(0.6, 0.8, -inf, -20.7),
+         (0.8, 1.2, -inf, -21.9),
+         (1.2, 1.8, -inf, -22.5),
+         (1.8, 2.2, -inf, -23.1)],
+    # Restrict BOSS sample.
+    1: [(-inf, 2.2, -inf, inf),
+        (2.8, inf, -inf, inf)],
+    # Restrict McGreer's samples to faint quasars to avoid overlap
+    # with Yang.
+    8: [(-inf, inf, -26.73, inf)]}
+
+class cutset:
+
+    """A cut table compiled for fast evaluation.
+
+    For every sample, the redshift range edges are sorted once and the
+    magnitude limits are tabulated on the intervals between them, so
+    that mask() needs a single np.searchsorted plus two comparisons
+    instead of one comparison chain per range.
+
+    """
+
+    def __init__(self, spec):
+
+        self.spec = spec
+
+        # Identifies this table in the names of cached masks.
+        text = repr(sorted((k, sorted(v)) for k, v in spec.items()))
+        self.digest = hashlib.sha1(text.encode()).hexdigest()
+
+        self.tables = {}
+        for sid, ranges in spec.items():
+            edges = np.unique([r[0] for r in ranges] + [r[1] for r in ranges])
+
+            # Interval i is [edges[i-1], edges[i]); intervals 0 and
+            # edges.size are outside all ranges.  Objects in intervals
+            # with no range have bright = +inf and are always cut.
+            bright = np.full(edges.size+1, np.inf)
+            faint = np.full(edges.size+1, -np.inf)
+            for z_min, z_max, m_bright, m_faint in ranges:
+                i = np.searchsorted(edges, z_min, side='right')
+                j = np.searchsorted(edges, z_max, side='right')
+                assert(np.all(np.isinf(bright[i:j]))), 'overlapping ranges'
+                bright[i:j] = m_bright
+                faint[i:j] = m_faint
+
+            self.tables[sid] = (edges, bright, faint)
+
+        return
+
+    def mask(self, z, mag, sid):
+
+        """Boolean mask of the objects of sample sid that pass the cuts."""
+
+        z = np.asarray(z)
+        mag = np.asarray(mag)
+
+        try:
+            edges, bright, faint = self.tables[sid]
+        except(KeyError):
+            return np.ones(z.shape, dtype=bool)
+
+        idx = np.searchsorted(edges, z, side='right')
+
+        return (mag > bright[idx]) & (mag <= faint[idx])
+
+individual = cutset(individual_spec)
+individual_maps = cutset(individual_map_spec)
+composite = cutset(composite_spec)
@@ -6,6 +6,7 @@ mpl.rcParams['font.family'] = 'serif'
 mpl.rcParams['font.serif'] = 'cm'
 mpl.rcParams['font.size'] = '22'
 import matplotlib.pyplot as plt
+import catalogue
 from random import shuffle
 import sys 
 
@@ -19,8 +20,7 @@ def getqlums(lumfile):
 
     """Read quasar luminosities."""
 
-    with open(lumfile,'r') as f: 
-        z, mag, p = np.loadtxt(lumfile, usecols=(1,2,3), unpack=True)
+    z, mag, p = catalogue.read_sample(lumfile)[:3]
         
     return z, mag, p
 
@@ -0,0 +1,273 @@
+import numpy as np
+from scipy.special import hyp2f1
+import dpl
+
+"""
+
+Integrals of the double-power-law luminosity function over magnitude,
+in closed form.
+
+With x = L/L_* = 10^(-0.4(M-M_*)), a = -(alpha+1) and b = -(beta+1),
+
+    phi dM = -(2.5/ln 10) phi_* x^-1 dx / (x^a + x^b),
+
+so the moments of the luminosity function are
+
+    int x^s phi dM = (2.5/ln 10) phi_* int x^(s-1)/(x^a + x^b) dx.
+
+With e = s-b, d = a-b and p = e/d, an antiderivative is
+
+    F_e(x) = x^e/e 2F1(1, p; p+1; -x^d) = sum_n (-1)^n x^(e+nd)/(e+nd),
+
+an incomplete beta function.  The range is split at x = 1 (M = M_*)
+and a, b are ordered on each side so that x^d <= 1, where the series
+converges.  The hypergeometric function is well behaved for p >= 1;
+for smaller p the first terms are taken out of the sum,
+
+    F_e = x^e/e - F_(e+d),
+
+until it is.  s = 0 gives the number density and s = 1 the luminosity
+density.  When alpha and beta are so close that more than MAX_TERMS
+terms would be needed, the integral is done by Gauss-Legendre
+quadrature in ln x instead.
+
+All parameters broadcast, so a block of parameter vectors (and limits)
+is integrated at once.  grid uses this to evaluate a model for many
+posterior draws and redshifts together:
+
+    n = dplint.density_grid(lfg, thetas, z, -35.0, -21.0) # (ndraws, nz)
+
+Run this file to compare speed and accuracy with the trapezoid rule on
+the 1000-point grids used before.
+
+"""
+
+# Zero point of the luminosity L = 10^((51.60-M)/2.5) erg s^-1 Hz^-1
+# of an AB magnitude M at 1450 A.
+LUMINOSITY_ZERO_POINT = 51.60
+
+# Largest number of terms taken out of the series; see above.
+MAX_TERMS = 8
+
+def _power(x1, x2, e):
+
+    """Integral of x^(e-1) from x1 to x2, also for e near 0."""
+
+    lnr = np.log(x2/x1)
+    er = e*lnr
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ratio = np.where(er == 0.0, 1.0, np.expm1(er)/er)
+
+    return x1**e*lnr*ratio
+
+def _quadrature(x1, x2, a, b, s, n=64):
+
+    """Integral of x^(s-1)/(x^a + x^b) from x1 to x2, numerically."""
+
+    y, w = np.polynomial.legendre.leggauss(n)
+
+    lo, hi = np.log(x1)[:, np.newaxis], np.log(x2)[:, np.newaxis]
+    lnx = 0.5*(hi + lo) + 0.5*(hi - lo)*y
+    f = np.exp(s*lnx)/(np.exp(a[:, np.newaxis]*lnx) + np.exp(b[:, np.newaxis]*lnx))
+
+    return 0.5*(hi - lo)[:, 0]*np.dot(f, w)
+
+def _piece(x1, x2, a, b, s):
+
+    """Integral of x^(s-1)/(x^a + x^b) from x1 to x2, where x^(a-b) <= 1.
+
+    All arguments but s are arrays of the same shape.
+
+    """
+
+    e = s - b
+    d = a - b
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        p = e/d
+
+    # Number of terms taken out of the series.
+    k = np.ceil(np.clip(1.0 - p, 0.0, MAX_TERMS + 1.0))
+    ok = (k <= MAX_TERMS) & (np.abs(p) < 1.0e4)
+
+    result = np.empty(x1.shape)
+    if np.any(~ok):
+        result[~ok] = _quadrature(x1[~ok], x2[~ok], a[~ok], b[~ok], s)
+
+    x1, x2, d, e, p, k = [v[ok] for v in (x1, x2, d, e, p, k)]
+
+    # The rest of the series, with p + k >= 1.
+    q = p + k
+    ek = e + k*d
+    r = (x2**ek*hyp2f1(1.0, q, q + 1.0, -x2**d)
+         - x1**ek*hyp2f1(1.0, q, q + 1.0, -x1**d))/ek
+    r *= (-1.0)**k
+
+    for j in range(MAX_TERMS):
+        use = j < k
+        r[use] += (-1.0)**j*_power(x1[use], x2[use], e[use] + j*d[use])
+
+    result[ok] = r
+
+    return result
+
+def _xmoment(x1, x2, a, b, s):
+
+    """Integral of x^(s-1)/(x^a + x^b) from x1 to x2 (both positive)."""
+
+    x1, x2, a, b = np.broadcast_arrays(*[np.array(v, dtype=float, ndmin=1)
+                                         for v in (x1, x2, a, b)])
+    lo, hi = np.minimum(a, b), np.maximum(a, b)
+
+    # Below x = 1 take the larger exponent first, above it the
+    # smaller, so that x^(a-b) <= 1 on each piece.
+    below = _piece(np.minimum(x1, 1.0), np.minimum(x2, 1.0), hi, lo, s)
+    above = _piece(np.maximum(x1, 1.0), np.maximum(x2, 1.0), lo, hi, s)
+
+    return below + above
+
+def moment(s, mbright, mfaint, log10phi_star, M_star, alpha, beta):
+
+    """Integral of (L/L_*)^s phi(M) dM from mbright to mfaint."""
+
+    x1 = 10.0**(-0.4*(mfaint - M_star))
+    x2 = 10.0**(-0.4*(mbright - M_star))
+
+    a = -(alpha + 1.0)
+    b = -(beta + 1.0)
+
+    result = 2.5/dpl.LN10*10.0**log10phi_star*_xmoment(x1, x2, a, b, s)
+
+    shape = np.broadcast(x1, x2, a, b, log10phi_star).shape
+
+    return result.reshape(shape)[()]
+
+def density(mbright, mfaint, log10phi_star, M_star, alpha, beta):
+
+    """Number density (cMpc^-3) of quasars between mbright and mfaint."""
+
+    return moment(0.0, mbright, mfaint, log10phi_star, M_star, alpha, beta)
+
+def luminosity_density(mbright, mfaint, log10phi_star, M_star, alpha, beta):
+
+    """1450 A luminosity density (erg s^-1 Hz^-1 cMpc^-3) between
+    mbright and mfaint.
+
+    """
+
+    L_star = 10.0**((LUMINOSITY_ZERO_POINT - M_star)/2.5)
+
+    return L_star*moment(1.0, mbright, mfaint, log10phi_star, M_star,
+                         alpha, beta)
+
+def dplparams(loglf, theta, z):
+
+    """DPL parameters at z of the model whose log10phi method is loglf.
+
+    Returns None if loglf is not a method of a model with a
+    dplparams method; callers then integrate numerically.
+
+    """
+
+    model = getattr(loglf, '__self__', None)
+
+    if not hasattr(model, 'dplparams'):
+        return None
+
+    return model.dplparams(theta, z)
+
+# Largest number of (draw, redshift) pairs evaluated at once by grid;
+# bounds its memory use.
+max_batch_elements = 2**16
+
+def dplparams_grid(lf, thetas, z, basis=None):
+
+    """DPL parameters of lf for each row of thetas and each z.
+
+    Returns four arrays of shape (len(thetas), len(z)).  lf is an
+    individual.lf (whose parameters do not depend on z), a
+    composite.lf or a composite.lf_polyb; for the last two, basis is
+    the result of lf.tabulate_zbasis(z), if the caller has it.
+
+    """
+
+    if basis is None:
+        params = lf.dplparams(thetas.T, z)
+    else:
+        params = lf.dplparams(thetas.T, z, basis)
+    shape = (len(thetas), z.size)
+
+    return [np.broadcast_to(np.reshape(p, (len(thetas), -1)), shape)
+            for p in params]
+
+def grid(function, lf, thetas, z, fallback=None):
+
+    """function(params, z) for each row of thetas (axis 0) and each z (axis 1).
+
+    params are the DPL parameters of lf for a chunk of thetas, from
+    dplparams_grid.  thetas is an (ndraws, nparams) array, or one
+    theta.
+
+    If lf has no dplparams method, fallback(theta, z) is called
+    instead for each theta and each z in turn.
+
+    """
+
+    thetas = np.atleast_2d(thetas)
+    z = np.atleast_1d(np.asarray(z, dtype=float))
+
+    result = np.empty((len(thetas), z.size))
+
+    if not hasattr(lf, 'dplparams'):
+        for i, theta in enumerate(thetas):
+            result[i] = [fallback(theta, x) for x in z]
+        return result
+
+    chunk = max(1, max_batch_elements//z.size)
+
+    for i in range(0, len(thetas), chunk):
+        params = dplparams_grid(lf, thetas[i:i+chunk], z)
+        result[i:i+chunk] = function(params, z)
+
+    return result
+
+def density_grid(lf, thetas, z, mbright, mfaint):
+
+    """density between mbright and mfaint for each row of thetas and each z."""
+
+    def n(params, z):
+        return density(mbright, mfaint, *params)
+
+    return grid(n, lf, thetas, z)
+
+if __name__ == '__main__':
+
+    import time
+    from scipy.integrate import trapezoid
+
+    np.random.seed(1)
+    n = 2000
+    params = (np.random.uniform(-9.0, -5.0, n),
+              np.random.uniform(-29.0, -23.0, n),
+              np.random.uniform(-6.0, -2.5, n),
+              np.random.uniform(-2.5, -1.1, n))
+
+    m = np.linspace(-30.0, -18.0, num=1000)
+    L = 10.0**((LUMINOSITY_ZERO_POINT - m)/2.5)
+
+    t0 = time.time()
+    phi = 10.0**dpl.log10phi(m, *[x[:, np.newaxis] for x in params])
+    n_trapz = trapezoid(phi, m, axis=1)
+    e_trapz = trapezoid(phi*L, m, axis=1)
+    t_trapz = time.time() - t0
+
+    t0 = time.time()
+    n_exact = density(-30.0, -18.0, *params)
+    e_exact = luminosity_density(-30.0, -18.0, *params)
+    t_exact = time.time() - t0
+
+    print('trapz: {:.3g} s, closed form: {:.3g} s'.format(t_trapz, t_exact))
+    print('max relative difference: density {:.2e}, luminosity density {:.2e}'.format(
+        np.max(np.abs(n_exact/n_trapz - 1.0)),
+        np.max(np.abs(e_exact/e_trapz - 1.0))))
@@ -8,6 +8,7 @@ from astropy.stats import knuth_bin_width  as kbw
 from astropy.stats import poisson_conf_interval as pci
 from scipy.stats import binned_statistic as bs
 import cosmolopy.distance as cd
+import dpl
 import random
 
 
@@ -41,9 +42,7 @@ def lfsample(theta, n, mlims):
         if x < mmax and x > mmin: 
             mag = x 
             log10phi_star, M_star, alpha, beta = theta 
-            phi = 10.0**log10phi_star / (10.0**(0.4*(alpha+1)*(mag-M_star)) +
-                                         10.0**(0.4*(beta+1)*(mag-M_star)))
-            return np.log(phi)
+            return dpl.lnphi(mag, log10phi_star, M_star, alpha, beta)
         else:
             return -np.inf 
     
@@ -11,6 +11,7 @@ from astropy.stats import knuth_bin_width  as kbw
 from astropy.stats import poisson_conf_interval as pci
 from scipy.stats import binned_statistic as bs
 import cosmolopy.distance as cd
+import dpl
 cosmo = {'omega_M_0':0.3,
          'omega_lambda_0':0.7,
          'omega_k_0':0.0,
@@ -39,9 +40,7 @@ def lfsample(theta, n, mlims):
         if x < mmax and x > mmin: 
             mag = x 
             log10phi_star, M_star, alpha, beta = theta 
-            phi = 10.0**log10phi_star / (10.0**(0.4*(alpha+1)*(mag-M_star)) +
-                                         10.0**(0.4*(beta+1)*(mag-M_star)))
-            return np.log(phi)
+            return dpl.lnphi(mag, log10phi_star, M_star, alpha, beta)
         else:
             return -np.inf 
     
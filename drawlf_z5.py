@@ -10,6 +10,7 @@ from astropy.stats import knuth_bin_width  as kbw
 from astropy.stats import poisson_conf_interval as pci
 from scipy.stats import binned_statistic as bs
 import cosmolopy.distance as cd
+import catalogue
 cosmo = {'omega_M_0':0.3,
          'omega_lambda_0':0.7,
          'omega_k_0':0.0,
@@ -44,7 +45,7 @@ def get_lf(lf, z_plot, sids):
     area = 6248.0 # deg^2
     dz = 0.05 
     dm = 0.1
-    zsel, msel, psel = np.loadtxt('Data/mcgreer13_dr7selfunc.dat', usecols=(1,2,3), unpack=True)
+    zsel, msel, psel = catalogue.loadcols('Data/mcgreer13_dr7selfunc.dat', (1,2,3))
     vol = volume(zsel, area)*dz
     
     # def volm(m, msel, psel, vsel):
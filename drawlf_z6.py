@@ -10,6 +10,7 @@ from astropy.stats import knuth_bin_width  as kbw
 from astropy.stats import poisson_conf_interval as pci
 from scipy.stats import binned_statistic as bs
 import cosmolopy.distance as cd
+import catalogue
 cosmo = {'omega_M_0':0.3,
          'omega_lambda_0':0.7,
          'omega_k_0':0.0,
@@ -47,7 +48,7 @@ def get_lf(lf, z_plot, sids):
     area = 260.0 # deg^2
     dz = 0.025 
     dm = 0.1
-    zsel, msel, psel = np.loadtxt('Data/jiang08_sel.dat', usecols=(1,2,3), unpack=True)
+    zsel, msel, psel = catalogue.loadcols('Data/jiang08_sel.dat', (1,2,3))
     vol = volume(zsel, area)*dz
     
     # def volm(mag, magsel, probsel, volsel, zsel):
@@ -96,7 +97,7 @@ def get_lf(lf, z_plot, sids):
     area = 195.0 # deg^2
     dz = 0.025 
     dm = 0.1
-    zsel, msel, psel = np.loadtxt('Data/jiang09_sel.dat', usecols=(1,2,3), unpack=True)
+    zsel, msel, psel = catalogue.loadcols('Data/jiang09_sel.dat', (1,2,3))
     vol = volume(zsel, area)*dz
 
     v2 = np.array([volm(x, msel, psel, vol, zsel) for x in m[6:]])
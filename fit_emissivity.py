@@ -2,8 +2,16 @@ import numpy as np
 import scipy.optimize as op
 import emcee
 import corner
+import mcpool
 
-def fit(x, y, sigma):
+def fit(x, y, sigma, processes=1):
+
+    """Fit the emissivity model to y(x) by MCMC.
+
+    With processes > 1, walkers are evaluated in that many worker
+    processes (see mcpool).
+
+    """
 
     def func(z, a, b, c, d, e):
         e = 10.0**a * (1.0+z)**b * np.exp(-c*z) / (np.exp(d*z)+e)
@@ -44,10 +52,17 @@ def fit(x, y, sigma):
     pos = [mcmc_start + 1e-4*np.random.randn(ndim) for i
            in range(nwalkers)]
 
-    sampler = emcee.EnsembleSampler(nwalkers, ndim,
-                                         lnprob, args=(x, y, sigma))
+    if processes != 1:
+        with mcpool.pool(lnprob, processes, vectorized=False) as p:
+            sampler = emcee.EnsembleSampler(nwalkers, ndim, p,
+                                            args=(x, y, sigma),
+                                            vectorize=True)
+            sampler.run_mcmc(pos, 1000)
+    else:
+        sampler = emcee.EnsembleSampler(nwalkers, ndim,
+                                             lnprob, args=(x, y, sigma))
 
-    sampler.run_mcmc(pos, 1000)
+        sampler.run_mcmc(pos, 1000)
     samples = sampler.chain[:, 500:, :].reshape((-1, ndim))
     
     bf = np.median(samples, axis=0)
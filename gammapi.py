@@ -7,6 +7,7 @@ mpl.rcParams['font.serif'] = 'cm'
 mpl.rcParams['font.size'] = '22'
 import matplotlib.pyplot as plt
 import rtg 
+import dplint
 from scipy.optimize import curve_fit
 import fit_emissivity
 import matplotlib.patches as mpatches
@@ -28,6 +29,11 @@ def f(loglf, theta, M, z, fit='composite'):
 def emissivity(loglf, theta, z, mlims, fit='composite'):
     # mlims = (lowest magnitude, brightest magnitude)
     #       = (brightest magnitude, faintest magnitude)
+    params = dplint.dplparams(loglf, theta, z)
+    if params is not None:
+        # Exact; see dplint.
+        return (dplint.luminosity_density(mlims[0], mlims[1], *params)
+                *((912.0/1450.0)**0.61)) # erg s^-1 Hz^-1 Mpc^-3
     m = np.linspace(mlims[0], mlims[1], num=1000)
     if fit=='individual':
         farr = f(loglf, theta, m, z, fit='individual')
@@ -39,9 +45,8 @@ def emissivity(loglf, theta, z, mlims, fit='composite'):
 def get_emissivity(lfi, z, Mfaint=-18.0):
 
     rindices = np.random.randint(len(lfi.samples), size=300)
-    e = np.array([emissivity(lfi.log10phi, theta, z, (-30.0, Mfaint), fit='individual')
-                          for theta
-                          in lfi.samples[rindices]])
+    e = emissivity_grid(lfi, lfi.samples[rindices], z, (-30.0, Mfaint),
+                        fit='individual')[:, 0]
     l = np.percentile(e, 15.87) 
     u = np.percentile(e, 84.13)
     c = np.mean(e)
@@ -63,6 +68,10 @@ def f_1450(loglf, theta, M, z, fit='composite'):
 def emissivity_1450(loglf, theta, z, mlims, fit='composite'):
     # mlims = (lowest magnitude, brightest magnitude)
     #       = (brightest magnitude, faintest magnitude)
+    params = dplint.dplparams(loglf, theta, z)
+    if params is not None:
+        # Exact; see dplint.
+        return dplint.luminosity_density(mlims[0], mlims[1], *params) # erg s^-1 Hz^-1 Mpc^-3
     m = np.linspace(mlims[0], mlims[1], num=1000)
     if fit=='individual':
         farr = f_1450(loglf, theta, m, z, fit='individual')
@@ -74,9 +83,8 @@ def emissivity_1450(loglf, theta, z, mlims, fit='composite'):
 def get_emissivity_1450(lfi, z, Mfaint=-18.0):
 
     rindices = np.random.randint(len(lfi.samples), size=300)
-    e = np.array([emissivity_1450(lfi.log10phi, theta, z, (-30.0, Mfaint), fit='individual')
-                          for theta
-                          in lfi.samples[rindices]])
+    e = emissivity_1450_grid(lfi, lfi.samples[rindices], z, (-30.0, Mfaint),
+                             fit='individual')[:, 0]
     l = np.percentile(e, 15.87) 
     u = np.percentile(e, 84.13)
     c = np.mean(e)
@@ -117,6 +125,60 @@ def Gamma_HI_singleslope(loglf, theta, z, fit='composite'):
     alpha_EUV = -1.7
     return 4.6e-13 * (em/1.0e24) * ((1.0+z)/5.0)**(-2.4) / (1.5-alpha_EUV) # s^-1
 
+def emissivity_grid(lf, thetas, z, mlims, fit='composite'):
+
+    """emissivity of lf for each row of thetas (axis 0) and each z (axis 1).
+
+    Models without a dplparams method are integrated numerically by
+    emissivity, one theta and one z at a time.
+
+    """
+
+    def e(params, z):
+        return (dplint.luminosity_density(mlims[0], mlims[1], *params)
+                *((912.0/1450.0)**0.61)) # erg s^-1 Hz^-1 Mpc^-3
+
+    def scalar(theta, z):
+        return emissivity(lf.log10phi, theta, z, mlims, fit=fit)
+
+    return dplint.grid(e, lf, thetas, z, fallback=scalar)
+
+def emissivity_1450_grid(lf, thetas, z, mlims, fit='composite'):
+
+    """emissivity_1450 of lf for each row of thetas and each z."""
+
+    def e(params, z):
+        return dplint.luminosity_density(mlims[0], mlims[1], *params) # erg s^-1 Hz^-1 Mpc^-3
+
+    def scalar(theta, z):
+        return emissivity_1450(lf.log10phi, theta, z, mlims, fit=fit)
+
+    return dplint.grid(e, lf, thetas, z, fallback=scalar)
+
+def Gamma_HI_grid(lf, thetas, z, fit='composite'):
+
+    """Gamma_HI of lf for each row of thetas and each z."""
+
+    def rate(params, z):
+
+        # Taken from Equation 11 of Lusso et al. 2015.
+        em = (dplint.luminosity_density(-30.0, -23.0, *params)
+              *((912.0/1450.0)**0.61))
+        alpha_EUV = -1.7
+        part1 = 4.6e-13 * (em/1.0e24) * ((1.0+z)/5.0)**(-2.4) / (1.5-alpha_EUV) # s^-1 
+
+        em = (dplint.luminosity_density(-23.0, -18.0, *params)
+              *((912.0/1450.0)**0.61))
+        alpha_EUV = -0.56
+        part2 = 4.6e-13 * (em/1.0e24) * ((1.0+z)/5.0)**(-2.4) / (1.5-alpha_EUV) # s^-1
+
+        return part1+part2 
+
+    def scalar(theta, z):
+        return Gamma_HI(lf.log10phi, theta, z, fit=fit)
+
+    return dplint.grid(rate, lf, thetas, z, fallback=scalar)
+
 def get_gamma_error(individuals):
 
     g_up = []
@@ -165,14 +227,12 @@ def plot_gamma(composite, individuals=None, zlims=(2.0,6.5), dirname='', fast=Tr
     if lsa:
 
         rindices = np.random.randint(len(composite.samples), size=900)
-        for theta in composite.samples[rindices]:
-            g = np.array([Gamma_HI(composite.log10phi, theta, rs) for rs in z])
-            g = np.log10(g)+12.0
+        ga = np.log10(Gamma_HI_grid(composite, composite.samples[rindices], z))+12.0
+        for g in ga:
             ax.plot(z, g, color='#67a9cf', alpha=0.1, zorder=1)
 
         bf = composite.samples.mean(axis=0)
-        g = np.array([Gamma_HI(composite.log10phi, bf, rs) for rs in z])
-        g = np.log10(g)+12.0
+        g = np.log10(Gamma_HI_grid(composite, bf, z)[0])+12.0
         ax.plot(z, g, color='k', zorder=2)
 
     if rt:
@@ -202,7 +262,7 @@ def plot_gamma(composite, individuals=None, zlims=(2.0,6.5), dirname='', fast=Tr
                 ga = np.vstack((ga, g))
                 
             bf = composite.samples.mean(axis=0)
-            g = np.array([Gamma_HI(composite.log10phi, bf, rs) for rs in z])
+            g = Gamma_HI_grid(composite, bf, z)[0]
             g = np.log10(g)+12.0
             ax.plot(z, g, color='k', zorder=2)
 
@@ -358,7 +418,7 @@ def draw(individuals, composite=None):
             ax.plot(z, g, color='#67a9cf', alpha=0.3, zorder=1)
 
         bf = composite.samples.median(axis=0)
-        g = np.array([Gamma_HI(composite.log10phi, bf, rs) for rs in z])
+        g = Gamma_HI_grid(composite, bf, z)[0]
         ax.plot(z, g, color='k', zorder=2)
         
     zm, gm, gm_up, gm_low = np.loadtxt('Data/BeckerBolton.dat',unpack=True)
@@ -1005,17 +1065,14 @@ def draw_emissivity(all_individuals, composite=None, select=False):
 
         nsample = 300
         rsample = composite.samples[np.random.randint(len(composite.samples), size=nsample)]
-        nzs = len(zc) 
-        e = np.zeros((nsample, nzs))
 
-        for i, theta in enumerate(rsample):
-            e[i] = np.array([emissivity(composite.log10phi, theta, x, (-30.0, -18.0)) for x in zc])
+        e = emissivity_grid(composite, rsample, zc, (-30.0, -18.0))
 
         up = np.percentile(e, 15.87, axis=0)
         down = np.percentile(e, 84.13, axis=0)
         ax.fill_between(zc, down, y2=up, color='goldenrod', zorder=1)
 
-        e = np.array([emissivity(composite.log10phi, bf, x, (-30.0, -18.0)) for x in zc])
+        e = emissivity_grid(composite, bf, zc, (-30.0, -18.0))[0]
         ax.plot(zc, e, c='k', lw=2) 
 
 
@@ -1047,10 +1104,8 @@ def get_gammapi_percentiles(lfi, z):
 
     """
     rindices = np.random.randint(len(lfi.samples), size=300)
-    g = np.array([np.log10(Gamma_HI(lfi.log10phi, theta, z,
-                                            fit='individual'))
-                  for theta
-                  in lfi.samples[rindices]])
+    g = np.log10(Gamma_HI_grid(lfi, lfi.samples[rindices], z,
+                               fit='individual')[:, 0])
     u = np.percentile(g, 15.87) 
     l = np.percentile(g, 84.13)
     c = np.mean(g)
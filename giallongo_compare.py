@@ -11,6 +11,7 @@ from astropy.stats import poisson_conf_interval as pci
 from scipy.stats import binned_statistic as bs
 from scipy.interpolate import interp1d
 import cosmolopy.distance as cd
+import catalogue
 cosmo = {'omega_M_0':0.3,
          'omega_lambda_0':0.7,
          'omega_k_0':0.0,
@@ -39,7 +40,7 @@ def binvol(m, zrange, bins, msel, psel, vsel, zsel):
     dm = np.array([1.0, 1.0, 1.0, 2.0, 1.0, 1.0, 1.0, 1.0, 1.0, 1.0])
     # dz = np.array([0.5, 0.5, 0.5, 0.5, 0.5, 0.5, 0.5, 1.5, 1.5, 1.5])
 
-    corr = np.loadtxt('Data_new/giallongo15_sel_correction.dat', usecols=(4,), unpack=True)
+    corr, = catalogue.loadcols('Data_new/giallongo15_sel_correction.dat', (4,))
 
     total_vol = 0.0
     for i in range(msel.size):
@@ -51,17 +52,17 @@ def binvol(m, zrange, bins, msel, psel, vsel, zsel):
 
 def get_lf(zrange, bins):
 
-    z, m, p = np.loadtxt('Data_new/giallongo15_sample.dat', usecols=(1, 2, 3), unpack=True)
+    z, m, p = catalogue.loadcols('Data_new/giallongo15_sample.dat', (1, 2, 3))
     select = ((z>=zrange[0]) & (z<zrange[1]))
     m = m[select]
     p = p[select]
 
     area = 0.047 # deg^2
-    zsel, msel, psel = np.loadtxt('Data_new/giallongo15_sel.dat', usecols=(1, 2, 3), unpack=True)
+    zsel, msel, psel = catalogue.loadcols('Data_new/giallongo15_sel.dat', (1, 2, 3))
     dz = zrange[1] - zrange[0]
     vol = volume(zsel, area)*dz
 
-    psel[(zsel < zrange[0]) | (zsel >= zrange[1])] = 0.0
+    psel = np.where((zsel < zrange[0]) | (zsel >= zrange[1]), 0.0, psel)
 
     v1 = np.array([binvol(x, zrange, bins, msel, psel, vol, zsel) for x in m])
 
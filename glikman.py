@@ -10,6 +10,7 @@ from astropy.stats import knuth_bin_width  as kbw
 from astropy.stats import poisson_conf_interval as pci
 from scipy.stats import binned_statistic as bs
 import cosmolopy.distance as cd
+import catalogue
 cosmo = {'omega_M_0':0.3,
          'omega_lambda_0':0.7,
          'omega_k_0':0.0,
@@ -56,9 +57,9 @@ def binvol(m, zrange, bins, msel, psel, vsel, zsel):
 def get_lf(zrange, bins, old=True):
 
     if old:
-        z, m, p = np.loadtxt('Data/glikman11qso.dat', usecols=(1, 2, 3), unpack=True)
+        z, m, p = catalogue.loadcols('Data/glikman11qso.dat', (1, 2, 3))
     else:
-        z, m, p = np.loadtxt('Data/glikman11debug.dat', usecols=(1, 2, 3), unpack=True)
+        z, m, p = catalogue.loadcols('Data/glikman11debug.dat', (1, 2, 3))
     select = ((z>=zrange[0]) & (z<zrange[1]))
     m = m[select]
     p = p[select]
@@ -67,24 +68,24 @@ def get_lf(zrange, bins, old=True):
     dz = 0.02
     dm = 0.05
     if old: 
-        zsel, msel, psel = np.loadtxt('Data/glikman11_selfunc_ndwfs_old.dat', usecols=(1,2,3), unpack=True)
+        zsel, msel, psel = catalogue.loadcols('Data/glikman11_selfunc_ndwfs_old.dat', (1,2,3))
     else:
-        zsel, msel, psel = np.loadtxt('Data/glikman11_selfunc_ndwfs.dat', usecols=(1,2,3), unpack=True)
+        zsel, msel, psel = catalogue.loadcols('Data/glikman11_selfunc_ndwfs.dat', (1,2,3))
     vol = volume(zsel, area)*dz
 
-    psel[(zsel < zrange[0]) | (zsel >= zrange[1])] = 0.0
+    psel = np.where((zsel < zrange[0]) | (zsel >= zrange[1]), 0.0, psel)
 
     # m[:12] because only those qsos are from NDWFS
     v1 = np.array([binvol(x, zrange, bins, msel, psel, vol, zsel) for x in m[:12]])
     
     area = 2.05 # deg^2
     if old:
-        zsel, msel, psel = np.loadtxt('Data/glikman11_selfunc_dls_old.dat', usecols=(1, 2, 3), unpack=True)
+        zsel, msel, psel = catalogue.loadcols('Data/glikman11_selfunc_dls_old.dat', (1, 2, 3))
     else:
-        zsel, msel, psel = np.loadtxt('Data/glikman11_selfunc_dls.dat', usecols=(1, 2, 3), unpack=True)
+        zsel, msel, psel = catalogue.loadcols('Data/glikman11_selfunc_dls.dat', (1, 2, 3))
     vol = volume(zsel, area)*dz
 
-    psel[(zsel < zrange[0]) | (zsel >= zrange[1])] = 0.0
+    psel = np.where((zsel < zrange[0]) | (zsel >= zrange[1]), 0.0, psel)
 
     # m[12:] because only those qsos are from DLS
     v2 = np.array([binvol(x, zrange, bins, msel, psel, vol, zsel) for x in m[12:]])
@@ -0,0 +1,155 @@
+import copy
+import numpy as np
+import scipy.optimize as op
+
+"""
+
+Importance reweighting of posterior samples.
+
+A change of the uniform priors, or dropping a survey, changes the
+posterior only a little, so the samples of the original fit can be
+reused with weights
+
+    w = exp(lnprob_new(theta) - lnprob_old(theta))
+
+instead of running the MCMC again.  reweight computes these weights
+for an lf (individual.lf or composite.lf) and returns them as a
+weights object, with the effective sample size
+
+    ESS = (sum w)^2 / sum w^2.
+
+If ESS falls below min_ess, the samples do not cover the new
+posterior well, and with rerun=True the MCMC is run again for the
+new model:
+
+    new = copy.copy(lfg)
+    new.prior_max_values = lfg.prior_max_values + 1.0
+    w = lfg.reweight(new)               # new priors
+    w = lfg.reweight(drop=[17])         # without survey 17
+    w.percentiles(1), w.ess
+
+Prior changes cost one lnprior call per sample.  Dropping surveys
+only evaluates the likelihood terms of those surveys (see the
+survey_terms methods).  Any other change of target, such as a
+different survey cut, evaluates its full likelihood once per sample.
+
+"""
+
+class weights:
+
+    """Posterior samples with importance weights."""
+
+    def __init__(self, samples, logw):
+
+        self.samples = samples
+        self.logw = logw
+
+        if np.any(np.isfinite(logw)):
+            w = np.exp(logw - np.max(logw))
+            self.w = w/w.sum()
+            self.ess = 1.0/np.sum(self.w**2)
+        else:
+            # No sample is inside the support of the new model.
+            self.w = np.zeros(len(logw))
+            self.ess = 0.0
+
+        # Set by reweight if ess < min_ess.
+        self.rerun = False
+
+        return
+
+    def quantile(self, x, q):
+
+        """Weighted quantile q (between 0 and 1) of the values x."""
+
+        order = np.argsort(x)
+        cdf = np.cumsum(self.w[order])
+
+        return np.interp(q, cdf - 0.5*self.w[order], x[order])
+
+    def percentiles(self, i):
+
+        """Weighted percentiles of parameter i, as individual.percentiles."""
+
+        x = self.samples[:, i]
+
+        return [self.quantile(x, 0.1587), self.quantile(x, 0.8413),
+                self.quantile(x, 0.5)]
+
+    def resample(self, n=None):
+
+        """n equally weighted samples, by systematic resampling."""
+
+        if n is None:
+            n = len(self.samples)
+
+        u = (np.random.rand() + np.arange(n))/n
+        index = np.searchsorted(np.cumsum(self.w), u)
+
+        return self.samples[np.minimum(index, len(self.samples)-1)]
+
+def shares_likelihood(a, b):
+
+    """True if lf objects a and b use the same data and tile arrays."""
+
+    return a.M1450 is b.M1450 and a.tile_w is b.tile_w
+
+def lnprior_batch(lf, thetas):
+
+    return np.array([lf.lnprior(theta) for theta in thetas])
+
+def reweight(lf, target=None, drop=(), samples=None, min_ess=1000,
+             rerun=False):
+
+    """Importance weights of the samples of lf for a modified model.
+
+    target is the modified lf, typically a copy of lf with other
+    priors (the default is lf itself); drop lists sample ids of
+    surveys whose quasars and selection maps are removed from target.
+    samples defaults to lf.samples.
+
+    If the ESS is below min_ess, the returned weights have rerun set,
+    and with rerun=True the MCMC of target without the dropped
+    surveys is run and its (equally weighted) samples returned.
+
+    """
+
+    if target is None:
+        target = lf
+    if samples is None:
+        samples = lf.samples
+
+    samples = np.asarray(samples)
+
+    if shares_likelihood(target, lf):
+        logw = lnprior_batch(target, samples) - lnprior_batch(lf, samples)
+    else:
+        logw = target.lnprob_batch(samples) - lf.lnprob_batch(samples)
+
+    if len(drop) > 0:
+        # lnprob is 2 (sum ln phi - lfnorm); see neglnlike.
+        data, norm = target.survey_terms(samples, drop)
+        logw -= 2.0*np.sum(data - norm, axis=1)
+
+    # Samples outside the support of target get zero weight.
+    logw[np.isnan(logw)] = -np.inf
+
+    result = weights(samples, logw)
+
+    if result.ess < min_ess:
+        print('Importance sampling ESS {:.0f} < {:d}.'.format(result.ess,
+                                                             min_ess))
+        result.rerun = True
+
+        if rerun:
+            if len(drop) > 0:
+                model = target.without_surveys(drop)
+            else:
+                model = copy.copy(target)
+            if not hasattr(model, 'bf'):
+                model.bf = op.OptimizeResult(x=lf.bf.x)
+            model.run_mcmc()
+            result = weights(model.samples, np.zeros(len(model.samples)))
+            result.model = model
+
+    return result
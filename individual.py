@@ -1,3 +1,4 @@
+import copy
 import numpy as np
 import scipy.optimize as op
 import emcee
@@ -17,62 +18,49 @@ cosmo = {'omega_M_0':0.3,
 import gammapi
 import rtg
 import corner
+import catalogue
+import cuts
+import dpl
+import mcpool
+import chains
+import importance
+import lbfgs
+
+def zwindow(z, zlims):
+
+    """Mask of the entries of z within zlims (all of them if None)."""
+
+    if zlims is None:
+        return np.ones(z.shape, dtype=bool)
+
+    z_min, z_max = zlims 
+    return ((z>=z_min) & (z<z_max))
 
 def getqlums(lumfile, zlims=None):
 
     """Read quasar luminosities."""
 
-    with open(lumfile,'r') as f: 
-        z, mag, p, area, sample_id = np.loadtxt(lumfile,
-                                                usecols=(1,2,3,4,5),
-                                                unpack=True)
-    if zlims is None:
-        select = None
+    z, mag, p, area, sample_id = catalogue.read_sample(lumfile)
+    window = zwindow(z, zlims)
+
+    z_all = z[window]
+    mag_all = mag[window]
+    p_all = p[window]
+    area_all = area[window]
+    sample_id_all = sample_id[window]
+
+    if sample_id.size == 0:
+        select = window
     else:
-        z_min, z_max = zlims 
-        select = ((z>=z_min) & (z<z_max))
-
-    z_all = z[select]
-    mag_all = mag[select]
-    p_all = p[select]
-    area_all = area[select]
-    sample_id_all = sample_id[select]
-
-    try:
-        sid = sample_id[0]
-    except(IndexError):
-        sid = sample_id
-
-    select = None
-
-    if sid == 13: 
-        select = ((((z_all>=0.0) & (z_all<0.2) & (mag_all<=-20.7)) |
-                   ((z_all>=0.2) & (z_all<0.4) & (mag_all<=-20.3)) |
-                   ((z_all>=0.4) & (z_all<0.6) & (mag_all<=-21.3)) |
-                   ((z_all>=0.6) & (z_all<0.8) & (mag_all<=-23.1)) | 
-                   ((z_all>=0.8) & (z_all<1.0) & (mag_all<=-23.7)) |
-                   ((z_all>=1.0) & (z_all<1.2)) |
-                   ((z_all>=1.2) & (z_all<1.4) & (mag_all<=-24.3)) |
-                   ((z_all>=1.4) & (z_all<1.6)) |
-                   ((z_all>=1.6) & (z_all<1.8) & (mag_all<=-24.9)) |
-                   ((z_all>=1.8) & (z_all<2.2))) |
-                  ((z_all>=3.5) & (z_all<4.7) & (mag_all<=-26.1)))
-        
-    if sid == 15: 
-        select = (((z_all>=0.4) & (z_all<0.6)) |
-                  ((z_all>=0.6) & (z_all<0.8) & (mag_all<=-20.7)) | 
-                  ((z_all>=0.8) & (z_all<1.2) & (mag_all<=-21.9)) |
-                  ((z_all>=1.2) & (z_all<1.8) & (mag_all<=-22.5)) |
-                  ((z_all>=1.8) & (z_all<2.2) & (mag_all<=-23.1)))
-
-    if sid == 8:
-        select = (mag_all > -26.73)
-
-    z = z_all[select]
-    mag = mag_all[select]
-    p = p_all[select]
-    area = area_all[select]
-    sample_id = sample_id_all[select]
+        # Survey restrictions; see cuts.individual_spec.
+        select = window & catalogue.read_mask(lumfile, cuts.individual,
+                                              sample_id[0])
+
+    z = z[select]
+    mag = mag[select]
+    p = p[select]
+    area = area[select]
+    sample_id = sample_id[select]
 
     return (z, mag, p, area, sample_id, z_all, mag_all, p_all,
             area_all, sample_id_all)
@@ -81,14 +69,8 @@ def getselfn(selfile, zlims=None):
 
     """Read selection map."""
 
-    with open(selfile,'r') as f: 
-        z, mag, p, dz, dm = np.loadtxt(f, usecols=(1,2,3,4,5), unpack=True)
-
-    if zlims is None:
-        select = None
-    else:
-        z_min, z_max = zlims 
-        select = ((z>=z_min) & (z<z_max))
+    z, mag, p, dz, dm = catalogue.read_selfn(selfile)
+    select = zwindow(z, zlims)
 
     return z[select], mag[select], p[select], dz[select], dm[select]
 
@@ -116,6 +98,8 @@ class selmap:
 
         self.label = label
         self.sid = sample_id
+
+        window = zwindow(catalogue.read_selfn(selection_map_file)[0], zlims)
         
         if sample_id == 7:
             # Set dz and dm for Giallongo's sample.  This sample needs
@@ -124,11 +108,7 @@ class selmap:
             # than the delta-z values in Giallongo's selection maps.
             self.dz = np.diff(zlims)
             self.dm = np.array([1.0, 1.0, 1.0, 2.0, 1.0, 1.0, 1.0, 1.0, 1.0, 1.0])
-            with open(selection_map_file, 'r') as f: 
-                z, mag, p = np.loadtxt(f, usecols=(1,2,3), unpack=True)
-            z_min, z_max = zlims 
-            select = ((z>=z_min) & (z<z_max))
-            self.dm = self.dm[select]
+            self.dm = self.dm[window]
             
         self.z_all, self.m_all, self.p_all, self.dz_all_array, self.dm_all_array = getselfn(selection_map_file, zlims=zlims)
 
@@ -138,45 +118,16 @@ class selmap:
         self.dz_array = self.dz_all_array
         self.dm_array = self.dm_all_array
     
-        select = None
-
         if sample_id == 7:
             # Correct Giallongo's p values to match published LF.  See
             # comments in giallongo15_sel_correction.dat.
-            with open(selection_map_file, 'r') as f: 
-                z, mag, p = np.loadtxt(f, usecols=(1,2,3), unpack=True)
-            z_min, z_max = zlims 
-            select = ((z>=z_min) & (z<z_max))
-            with open('Data_new/giallongo15_sel_correction.dat', 'r') as f: 
-                corr = np.loadtxt(f, usecols=(4,), unpack=True)
-            corr = corr[select]
+            corr, = catalogue.loadcols('Data_new/giallongo15_sel_correction.dat', (4,))
+            corr = corr[window]
             self.p_all = self.p_all/corr
-            select = ((self.z_all>=z_min) & (self.z_all<z_max))
-
-        if sample_id == 13: 
-            select = ((((self.z_all>=0.0) & (self.z_all<0.2) & (self.m_all<=-20.7)) | 
-                       ((self.z_all>=0.2) & (self.z_all<0.4) & (self.m_all<=-20.4)) | 
-                       ((self.z_all>=0.4) & (self.z_all<0.6) & (self.m_all<=-21.3)) | 
-                       ((self.z_all>=0.6) & (self.z_all<0.8) & (self.m_all<=-23.1)) | 
-                       ((self.z_all>=0.8) & (self.z_all<1.0) & (self.m_all<=-23.7)) |
-                       ((self.z_all>=1.0) & (self.z_all<1.2)) |
-                       ((self.z_all>=1.2) & (self.z_all<1.4) & (self.m_all<=-24.3)) |
-                       ((self.z_all>=1.4) & (self.z_all<1.6)) |
-                       ((self.z_all>=1.6) & (self.z_all<1.8) & (self.m_all<=-24.9)) |
-                       ((self.z_all>=1.8) & (self.z_all<2.2))) |
-                      ((self.z_all>=3.5) & (self.z_all<4.7) & (self.m_all<=-26.1)))
-
-        if sample_id == 15: 
-            select = (((self.z_all>=0.4) & (self.z_all<0.6)) | 
-                      ((self.z_all>=0.6) & (self.z_all<0.8) & (self.m_all<=-20.7)) | 
-                      ((self.z_all>=0.8) & (self.z_all<1.2) & (self.m_all<=-21.9)) |
-                      ((self.z_all>=1.2) & (self.z_all<1.8) & (self.m_all<=-22.5)) |
-                      ((self.z_all>=1.8) & (self.z_all<2.2) & (self.m_all<=-23.1)))
-            
-        if sample_id == 8:
-            # Restrict McGreer's samples to faint quasars to avoid
-            # overlap with Yang.
-            select = (self.m_all>-26.73)
+
+        # Survey restrictions; see cuts.individual_map_spec.
+        select = catalogue.read_mask(selection_map_file, cuts.individual_maps,
+                                     sample_id)[window]
 
         if self.z_all.size == 0:
             return # This selmap has no points in zlims
@@ -203,7 +154,7 @@ class selmap:
     def nqso(self, lumfn, theta):
 
         try: 
-            psi = 10.0**lumfn.log10phi(theta, self.m)
+            psi = np.exp(lumfn.lnphi(theta, self.m))
             # Except for Giallongo's sample, self.dm is assumed to be
             # constant here; may not be true.
             tot = psi*self.p*self.volarr*self.dm_array
@@ -211,12 +162,121 @@ class selmap:
         except(AttributeError):
             return 0 
             
+class registry:
+
+    """Quasar samples and selection maps read and processed once.
+
+    All survey restrictions and tile volumes are computed here for
+    the full redshift range, and every array is sorted by redshift,
+    so that a redshift bin is just a slice (a view, not a copy).  Pass
+    an instance to lf(registry=..., zlims=...) when fitting many
+    redshift bins with the same surveys, as in bins.py.
+
+    Giallongo's selection map (sample 7) is set up for one redshift
+    bin narrower than its tiles (see selmap), so it cannot be read
+    once for all bins; fit it with lf(selection_maps=..., zlims=...).
+
+    """
+
+    # Selmap attributes that have one entry per selected tile, and
+    # per tile before survey restrictions.
+    map_fields = ('z', 'm', 'p', 'dz_array', 'dm_array', 'volarr')
+    map_fields_all = ('z_all', 'm_all', 'p_all', 'dz_all_array',
+                      'dm_all_array', 'volarr_all')
+
+    def __init__(self, quasar_files=None, selection_maps=None):
+
+        everything = (-np.inf, np.inf)
+
+        if any(x[2] == 7 for x in selection_maps):
+            raise ValueError('the selection map of sample 7 needs a '
+                             'per-bin lf, not a registry')
+
+        qsos = [getqlums(datafile, zlims=everything)
+                for datafile in quasar_files]
+        (z, m, p, area, sid,
+         z_all, m_all, p_all,
+         area_all, sid_all) = [np.concatenate([np.ravel(x) for x in c])
+                               for c in zip(*qsos)]
+
+        idx = np.argsort(z, kind='mergesort')
+        self.z = z[idx]
+        self.M1450 = m[idx]
+        self.p = p[idx]
+        self.area = area[idx]
+        self.sid = sid[idx]
+
+        idx = np.argsort(z_all, kind='mergesort')
+        self.z_all = z_all[idx]
+        self.M1450_all = m_all[idx]
+        self.p_all = p_all[idx]
+        self.area_all = area_all[idx]
+        self.sid_all = sid_all[idx]
+
+        self.maps = [selmap(x, everything) for x in selection_maps]
+        self.maps = [x for x in self.maps if x.z.size > 0]
+
+        for x in self.maps:
+            idx = np.argsort(x.z, kind='mergesort')
+            for field in self.map_fields:
+                setattr(x, field, np.atleast_1d(getattr(x, field))[idx])
+            idx = np.argsort(x.z_all, kind='mergesort')
+            for field in self.map_fields_all:
+                setattr(x, field, np.atleast_1d(getattr(x, field))[idx])
+
+        return
+
+    def quasars(self, zlims):
+
+        """Quasars in zlims, with and without survey restrictions."""
+
+        z_min, z_max = zlims
+        
+        lo, hi = np.searchsorted(self.z, (z_min, z_max))
+        lo_all, hi_all = np.searchsorted(self.z_all, (z_min, z_max))
+
+        return (self.z[lo:hi], self.M1450[lo:hi], self.p[lo:hi],
+                self.area[lo:hi], self.sid[lo:hi],
+                self.z_all[lo_all:hi_all], self.M1450_all[lo_all:hi_all],
+                self.p_all[lo_all:hi_all], self.area_all[lo_all:hi_all],
+                self.sid_all[lo_all:hi_all])
+
+    def selmaps(self, zlims):
+
+        """Copies of the selection maps restricted to zlims."""
+
+        z_min, z_max = zlims
+        maps = []
+
+        for x in self.maps:
+            y = copy.copy(x)
+            lo, hi = np.searchsorted(x.z, (z_min, z_max))
+            for field in self.map_fields:
+                setattr(y, field, getattr(x, field)[lo:hi])
+            lo, hi = np.searchsorted(x.z_all, (z_min, z_max))
+            for field in self.map_fields_all:
+                setattr(y, field, getattr(x, field)[lo:hi])
+            
+            # Just two aliases for older parts of the code 
+            y.dz = y.dz_array
+            y.dm = y.dm_array
+            maps.append(y)
+
+        return maps
+    
 class lf:
 
-    def __init__(self, quasar_files=None, selection_maps=None, zlims=None):
+    def __init__(self, quasar_files=None, selection_maps=None, zlims=None,
+                 registry=None):
 
         self.zlims = zlims
 
+        if registry is not None:
+            (self.z, self.M1450, self.p, self.area, self.sid,
+             self.z_all, self.M1450_all, self.p_all,
+             self.area_all, self.sid_all) = registry.quasars(zlims)
+            quasar_files = [] 
+
         for datafile in quasar_files:
             (z, m, p, area, sid,
              z_all, m_all, p_all,
@@ -251,7 +311,10 @@ class lf:
         if zlims is not None:
             self.dz = zlims[1]-zlims[0]
 
-        self.maps = [selmap(x, zlims) for x in selection_maps]
+        if registry is not None:
+            self.maps = registry.selmaps(zlims)
+        else:
+            self.maps = [selmap(x, zlims) for x in selection_maps]
 
         # Remove selection maps that lie outside our redshift range.
         self.maps = [x for x in self.maps if x.z.size > 0]
@@ -260,30 +323,117 @@ class lf:
         # this redshift bin.  
         samples = set(np.unique(self.sid))
         self.maps = [x for x in self.maps if x.sid in samples]
+
+        self.flatten_maps()
         
         return
 
+    def flatten_maps(self):
+
+        """Concatenate the tiles of all selection maps.
+
+        lfnorm uses these arrays so that the normalisation is a single
+        evaluation of log10phi and one dot product, instead of a loop
+        over selmaps.  Call this again after changing self.maps.
+
+        """
+
+        maps = [x for x in self.maps if hasattr(x, 'volarr')]
+
+        if len(maps) == 0:
+            self.tile_m = np.array([])
+            self.tile_z = np.array([])
+            self.tile_w = np.array([])
+            self.tile_sid = np.array([])
+            return
+
+        self.tile_m = np.concatenate([np.ravel(x.m) for x in maps])
+        self.tile_z = np.concatenate([np.ravel(x.z) for x in maps])
+
+        # Except for Giallongo's sample, dm is assumed to be constant
+        # within a map; may not be true.
+        self.tile_w = np.concatenate([np.ravel(x.p*x.volarr*x.dm_array)
+                                      for x in maps])
+        self.tile_sid = np.concatenate([np.full(np.size(x.m), x.sid)
+                                        for x in maps])
+
+        return
+
+    def dplparams(self, theta, z=None):
+
+        """Double-power-law parameters; they do not evolve within a bin."""
+
+        log10phi_star, M_star, alpha, beta = theta
+
+        return log10phi_star, M_star, alpha, beta
+
     def log10phi(self, theta, mag):
 
         log10phi_star, M_star, alpha, beta = theta 
 
-        phi = 10.0**log10phi_star / (10.0**(0.4*(alpha+1)*(mag-M_star)) +
-                                     10.0**(0.4*(beta+1)*(mag-M_star)))
-        return np.log10(phi)
+        return dpl.log10phi(mag, log10phi_star, M_star, alpha, beta)
+
+    def lnphi(self, theta, mag):
+
+        log10phi_star, M_star, alpha, beta = theta 
+
+        return dpl.lnphi(mag, log10phi_star, M_star, alpha, beta)
 
     def lfnorm(self, theta):
 
-        ns = np.array([x.nqso(self, theta) for x in self.maps])
-        return sum(ns) 
+        psi = np.exp(self.lnphi(theta, self.tile_m))
+        return np.dot(psi, self.tile_w)
 
     def neglnlike(self, theta):
 
-        logphi = self.log10phi(theta, self.M1450) # Mpc^-3 mag^-1
-        logphi /= np.log10(np.e) # Convert to base e 
+        lnphi = self.lnphi(theta, self.M1450) # Mpc^-3 mag^-1
+
+        return -2.0*lnphi.sum() + 2.0*self.lfnorm(theta)
+
+    def neglnlike_and_grad(self, theta):
+
+        """neglnlike and its analytic gradient with respect to theta."""
+
+        log10phi_star, M_star, alpha, beta = theta
+
+        lnphi, dlnphi = dpl.lnphi_and_grad(self.M1450, log10phi_star,
+                                           M_star, alpha, beta)
+        lnphi_t, dlnphi_t = dpl.lnphi_and_grad(self.tile_m, log10phi_star,
+                                               M_star, alpha, beta)
+        n = self.tile_w*np.exp(lnphi_t) # Expected qsos per tile
 
-        return -2.0*logphi.sum() + 2.0*self.lfnorm(theta)
+        f = -2.0*lnphi.sum() + 2.0*n.sum()
+        grad = -2.0*dlnphi.sum(axis=1) + 2.0*np.dot(dlnphi_t, n)
+
+        return f, grad
+
+    def fisher_diag(self, theta):
+
+        """Diagonal of the Fisher matrix of neglnlike at theta."""
+
+        lnphi_t, dlnphi_t = dpl.lnphi_and_grad(self.tile_m, *theta)
+        n = self.tile_w*np.exp(lnphi_t)
+
+        return 2.0*np.dot(dlnphi_t**2, n)
 
     def bestfit(self, guess, method='Nelder-Mead'):
+
+        if method == 'L-BFGS-B':
+            # Gradient-based; uses the analytic gradient of neglnlike.
+            prior = None
+            if hasattr(self, 'prior_min_values'):
+                prior = (self.prior_min_values, self.prior_max_values)
+
+            result = lbfgs.minimize(self.neglnlike_and_grad,
+                                    self.fisher_diag, guess, prior=prior,
+                                    maxiter=8000, disp=False)
+
+            if not result.success:
+                print('Likelihood optimisation did not converge.')
+
+            self.bf = result
+            return result
+
         result = op.minimize(self.neglnlike,
                              guess,
                              method=method,
@@ -327,23 +477,220 @@ class lf:
 
         return lp - self.neglnlike(theta)
 
-    def run_mcmc(self,num_runs=1000):
+    # Number of (theta, quasar) or (theta, tile) pairs evaluated at
+    # once by the batched methods.  neglnlike_batch takes all thetas
+    # together over blocks of points this size, small enough to stay
+    # in cache; larger blocks are slower.
+    max_batch_elements = 2**15
+
+    def neglnlike_batch(self, thetas):
+
+        """neglnlike for each row of the (ntheta, nparams) array thetas."""
+
+        thetas = np.atleast_2d(thetas)
+        data = np.zeros(len(thetas))
+        norm = np.zeros(len(thetas))
+
+        # Shape (nparams, ntheta, 1), so that each parameter
+        # broadcasts against the data along the last axis.
+        t = thetas.T[:, :, np.newaxis]
+        step = max(1, self.max_batch_elements//len(thetas))
+
+        for i in range(0, self.M1450.size, step):
+            data += self.lnphi(t, self.M1450[i:i+step]).sum(axis=1) # Mpc^-3 mag^-1
+
+        for i in range(0, self.tile_m.size, step):
+            norm += np.dot(np.exp(self.lnphi(t, self.tile_m[i:i+step])),
+                           self.tile_w[i:i+step])
+
+        return -2.0*data + 2.0*norm
+
+    def lnprob_batch(self, thetas):
+
+        """lnprob for each row of thetas, for emcee's vectorize mode."""
+
+        thetas = np.atleast_2d(thetas)
+
+        lp = np.array([self.lnprior(theta) for theta in thetas])
+        result = np.full(len(thetas), -np.inf)
+
+        ok = np.isfinite(lp)
+        if np.any(ok):
+            result[ok] = lp[ok] - self.neglnlike_batch(thetas[ok])
+
+        return result
+
+    def pointwise_lnlike(self, thetas):
+
+        """ln likelihood of each quasar, for each row of thetas.
+
+        Returns an array of shape (ntheta, nqso) of
+        ln phi(M) - ln lfnorm(theta), the likelihood of one data point
+        used by waic.
+
+        """
+
+        thetas = np.atleast_2d(thetas)
+        result = np.empty((len(thetas), self.M1450.size))
+
+        npoints = max(self.M1450.size, self.tile_m.size, 1)
+        chunk = max(1, self.max_batch_elements//npoints)
+
+        for i in range(0, len(thetas), chunk):
+            t = thetas[i:i+chunk].T[:, :, np.newaxis]
+
+            norm = np.dot(np.exp(self.lnphi(t, self.tile_m)), self.tile_w)
+            result[i:i+chunk] = (self.lnphi(t, self.M1450)
+                                 - np.log(norm)[:, np.newaxis])
+
+        return result
+
+    def survey_terms(self, thetas, sids):
+
+        """Contributions of the surveys sids to the likelihood.
+
+        Returns arrays data and norm of shape (ntheta, len(sids)): the
+        sum of ln phi over the quasars of each survey, and the part of
+        lfnorm from its selection maps, so that neglnlike is
+        -2 sum(data) + 2 sum(norm) over all surveys.
+
+        """
+
+        thetas = np.atleast_2d(thetas)
+        sids = np.asarray(sids)
+
+        q = np.isin(self.sid, sids)
+        t = np.isin(self.tile_sid, sids)
+
+        # (npoints, nsids) indicator matrices of survey membership.
+        qs = (self.sid[q, np.newaxis] == sids).astype(float)
+        ts = (self.tile_sid[t, np.newaxis] == sids)*self.tile_w[t, np.newaxis]
+
+        data = np.empty((len(thetas), sids.size))
+        norm = np.empty((len(thetas), sids.size))
+
+        npoints = max(q.sum(), t.sum(), 1)
+        chunk = max(1, self.max_batch_elements//npoints)
+
+        for i in range(0, len(thetas), chunk):
+            p = thetas[i:i+chunk].T[:, :, np.newaxis]
+
+            data[i:i+chunk] = np.dot(self.lnphi(p, self.M1450[q]), qs)
+
+            psi = np.exp(self.lnphi(p, self.tile_m[t]))
+            norm[i:i+chunk] = np.dot(psi, ts)
+
+        return data, norm
+
+    def without_surveys(self, sids):
+
+        """Copy of this model without the quasars and maps of surveys sids."""
+
+        new = copy.copy(self)
+
+        keep = ~np.isin(self.sid, sids)
+        new.z = self.z[keep]
+        new.M1450 = self.M1450[keep]
+        new.p = self.p[keep]
+        new.area = self.area[keep]
+        new.sid = self.sid[keep]
+
+        new.maps = [x for x in self.maps if x.sid not in sids]
+        new.flatten_maps()
+
+        return new
+
+    def reweight(self, target=None, drop=(), samples=None, min_ess=1000,
+                 rerun=False):
+
+        """Importance weights of self.samples for a modified model.
+
+        See importance.reweight.
+
+        """
+
+        return importance.reweight(self, target=target, drop=drop,
+                                   samples=samples, min_ess=min_ess,
+                                   rerun=rerun)
+
+    def run_mcmc(self,num_runs=1000, vectorize=True, processes=1,
+                 chainfile=None, resume=False, neff=None, pos=None):
         """
         Run emcee.
 
+        With vectorize=True, all walkers are evaluated together by
+        lnprob_batch at each step (requires emcee 3).  With processes
+        > 1 (None for all CPUs), the walkers are split between that
+        many worker processes; see mcpool.
+
+        If chainfile is given, the chain is written to that file as
+        it runs (see chains.chainfile) instead of being kept in memory.
+        With resume=True, a run that was interrupted continues from
+        the last step saved in chainfile, up to num_runs steps in
+        total.
+
+        If neff is given, the run stops as soon as the chain holds neff
+        effective samples (see chains.run_until_converged), with
+        num_runs as the maximum number of steps.  Burn-in and thinning
+        are then set from the autocorrelation time and stored, with
+        it, in self.tau, self.burnin, self.thin and self.converged.
+        Otherwise the first half of the chain is discarded.
+
+        The walkers start from pos, an (nwalkers, ndim) array, if it
+        is given, and otherwise in a small ball around self.bf.x.
+
         """
         self.ndim, self.nwalkers = self.bf.x.size, 100
         self.mcmc_start = self.bf.x 
-        pos = [self.mcmc_start + 1e-4*np.random.randn(self.ndim) for i
-               in range(self.nwalkers)]
-        
-        self.sampler = emcee.EnsembleSampler(self.nwalkers, self.ndim,
-                                             self.lnprob)
-
-        #self.sampler.run_mcmc(pos, 1000)
-        #self.samples = self.sampler.chain[:, 500:, :].reshape((-1, self.ndim))
-        self.sampler.run_mcmc(pos, num_runs)
-        self.samples = self.sampler.chain[:, int(num_runs/2):, :].reshape((-1, self.ndim))
+        if pos is None:
+            pos = [self.mcmc_start + 1e-4*np.random.randn(self.ndim) for i
+                   in range(self.nwalkers)]
+        else:
+            self.nwalkers = len(pos)
+
+        backend = None
+        if chainfile is not None:
+            backend = chains.chainfile(chainfile, resume=resume)
+        elif resume:
+            raise ValueError('resume=True needs a chainfile')
+
+        if processes != 1:
+            # Each worker evaluates a block of walkers; see mcpool.
+            pool = mcpool.pool(self.lnprob_batch, processes)
+            lnprob, vectorize = pool, True
+        elif vectorize:
+            lnprob = self.lnprob_batch
+        else:
+            lnprob = self.lnprob
+
+        try:
+            self.sampler = emcee.EnsembleSampler(self.nwalkers, self.ndim,
+                                                 lnprob, vectorize=vectorize,
+                                                 backend=backend)
+
+            if self.sampler.iteration > 0:
+                # Continue from the last saved step.
+                pos = None
+
+            if neff is not None:
+                (self.tau, self.burnin,
+                 self.thin, self.converged) = chains.run_until_converged(
+                     self.sampler, pos, neff, num_runs)
+            elif num_runs > self.sampler.iteration:
+                self.sampler.run_mcmc(pos, num_runs-self.sampler.iteration)
+        finally:
+            if processes != 1:
+                pool.close()
+            if backend is not None:
+                backend.close()
+
+        if neff is not None:
+            if not self.converged:
+                print('MCMC did not reach {:d} effective samples.'.format(neff))
+            self.samples = self.sampler.get_chain(discard=self.burnin,
+                                                  thin=self.thin, flat=True)
+        else:
+            self.samples = self.sampler.chain[:, int(num_runs/2):, :].reshape((-1, self.ndim))
         
 
         return
@@ -373,8 +720,10 @@ class lf:
     
     def plot_chains(self, fig, param, ylabel):
         ax = fig.add_subplot(self.bf.x.size, 1, param+1)
+        # get_chain, so that the in-memory chains of binfit work too.
+        chain = self.sampler.get_chain()
         for i in range(self.nwalkers): 
-            ax.plot(self.sampler.chain[i,:,param], c='k', alpha=0.1)
+            ax.plot(chain[:,i,param], c='k', alpha=0.1)
         self.medians = np.median(self.samples, axis=0)
         ax.axhline(self.medians[param], c='#CC9966', dashes=[7,2], lw=2) 
         ax.set_ylabel(ylabel)
@@ -21,13 +21,14 @@ import gammapi
 import rtg
 import corner
 from lfsample import lfsampleComp
+import catalogue
+import dpl
 
 def getqlums(lumfile, zlims=None):
 
     """Read quasar luminosities."""
 
-    with open(lumfile,'r') as f: 
-        z, mag, p, area, sample_id = np.loadtxt(lumfile, usecols=(1,2,3,4,5), unpack=True)
+    z, mag, p, area, sample_id = catalogue.read_sample(lumfile)
 
     if zlims is None:
         select = None
@@ -72,8 +73,7 @@ def getselfn(selfile, zlims=None):
 
     """Read selection map."""
 
-    with open(selfile,'r') as f: 
-        z, mag, p = np.loadtxt(f, usecols=(1,2,3), unpack=True)
+    z, mag, p = catalogue.loadcols(selfile, (1,2,3))
 
     if zlims is None:
         select = None
@@ -115,8 +115,7 @@ class selmap:
             # in Giallongo's selection maps.
             self.dz = np.diff(zlims)
             self.dm = np.array([1.0, 1.0, 1.0, 2.0, 1.0, 1.0, 1.0, 1.0, 1.0, 1.0])
-            with open(selection_map_file, 'r') as f: 
-                z, mag, p = np.loadtxt(f, usecols=(1,2,3), unpack=True)
+            z, mag, p = catalogue.loadcols(selection_map_file, (1,2,3))
             z_min, z_max = zlims 
             select = ((z>=z_min) & (z<z_max))
             self.dm = self.dm[select]
@@ -126,12 +125,10 @@ class selmap:
         if sample_id == 7:
             # Correct Giallongo's p values to match published LF.  See
             # comments in giallongo15_sel_correction.dat.
-            with open(selection_map_file, 'r') as f: 
-                z, mag, p = np.loadtxt(f, usecols=(1,2,3), unpack=True)
+            z, mag, p = catalogue.loadcols(selection_map_file, (1,2,3))
             z_min, z_max = zlims 
             select = ((z>=z_min) & (z<z_max))
-            with open('Data_new/giallongo15_sel_correction.dat', 'r') as f: 
-                corr = np.loadtxt(f, usecols=(4,), unpack=True)
+            corr, = catalogue.loadcols('Data_new/giallongo15_sel_correction.dat', (4,))
             corr = corr[select]
             self.p = self.p/corr
 
@@ -231,9 +228,7 @@ class lf:
 
         log10phi_star, M_star, alpha, beta = theta 
 
-        phi = 10.0**log10phi_star / (10.0**(0.4*(alpha+1)*(mag-M_star)) +
-                                     10.0**(0.4*(beta+1)*(mag-M_star)))
-        return np.log10(phi)
+        return dpl.log10phi(mag, log10phi_star, M_star, alpha, beta)
 
     def lfnorm(self, theta):
 
@@ -242,10 +237,10 @@ class lf:
 
     def neglnlike(self, theta):
 
-        logphi = self.log10phi(theta, self.M1450) # Mpc^-3 mag^-1
-        logphi /= np.log10(np.e) # Convert to base e 
+        log10phi_star, M_star, alpha, beta = theta 
+        lnphi = dpl.lnphi(self.M1450, log10phi_star, M_star, alpha, beta)
 
-        return -2.0*logphi.sum() + 2.0*self.lfnorm(theta)
+        return -2.0*lnphi.sum() + 2.0*self.lfnorm(theta)
 
     def bestfit(self, guess, method='Nelder-Mead'):
         result = op.minimize(self.neglnlike,
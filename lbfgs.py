@@ -0,0 +1,56 @@
+import numpy as np
+import scipy.optimize as op
+
+"""
+
+L-BFGS-B best fits with the analytic gradient of neglnlike, shared by
+the bestfit methods of individual.lf and composite.lf.
+
+The parameters are measured in units of their Fisher errors at the
+starting point, because the raw gradient components differ by orders
+of magnitude and a unit first step would overflow phi.  If a prior is
+given the search stays strictly inside it, since the likelihood alone
+leaves some directions unconstrained.
+
+"""
+
+def minimize(neglnlike_and_grad, fisher_diag, guess, prior=None,
+             maxiter=20000, disp=True):
+
+    """Minimise neglnlike from guess.
+
+    neglnlike_and_grad(theta) returns the value and the gradient,
+    fisher_diag(theta) the diagonal of the Fisher matrix, and prior,
+    if not None, is (prior_min_values, prior_max_values).  Returns the
+    scipy.optimize result in the original parameters.
+
+    """
+
+    guess = np.asarray(guess, dtype=float)
+    scale = 1.0/np.sqrt(fisher_diag(guess))
+
+    def f(u):
+        value, grad = neglnlike_and_grad(guess + u*scale)
+        return value, grad*scale
+
+    bounds = None
+    if prior is not None:
+        lo, hi = prior
+        margin = 1.0e-6*(hi - lo)
+        bounds = list(zip((lo + margin - guess)/scale,
+                          (hi - margin - guess)/scale))
+
+    result = op.minimize(f,
+                         np.zeros_like(guess),
+                         method='L-BFGS-B',
+                         jac=True,
+                         bounds=bounds,
+                         options={'maxiter': maxiter,
+                                  'maxcor': 30,
+                                  'ftol': 1.0e-12,
+                                  'gtol': 1.0e-6,
+                                  'disp': disp})
+    result.x = guess + result.x*scale
+    result.jac = result.jac/scale
+
+    return result
@@ -1,5 +1,6 @@
 import sys
 import numpy as np 
+import posterior
 from composite import lf
 from composite import lf_polyb
 from summary_fromFile import summary_plot as sp
@@ -47,11 +48,15 @@ selnfiles = [('Selmaps_with_tiles/dr7z2p2_selfunc.dat', 6248.0, 13),
 
 case = 13
 
+# Bin quasars onto the selection-map tiles (see
+# composite.bin_quasars); much faster, for exploring models.
+binned = False
+
 if case == 0:
 
     # Currently favoured model
     
-    lfg = lf(quasar_files=qlumfiles, selection_maps=selnfiles, pnum=[3,4,2,5])
+    lfg = lf(quasar_files=qlumfiles, selection_maps=selnfiles, binned=binned, pnum=[3,4,2,5])
 
     g = np.array([-7.95061036, 1.15284665, -0.12037541,
                   -18.64592897, -4.52638114, 0.47207865, -0.01890026,
@@ -63,7 +68,7 @@ if case == 0:
 
     assert(np.all(lfg.prior_min_values < lfg.prior_max_values))
 
-    method = 'Nelder-Mead'
+    method = 'L-BFGS-B'
     b = lfg.bestfit(g, method=method)
     print(b)
 
@@ -82,7 +87,7 @@ if case == 0:
     
 elif case == 1:
 
-    lfg = lf_polyb(quasar_files=qlumfiles, selection_maps=selnfiles, pnum=[3,4,3,3])
+    lfg = lf_polyb(quasar_files=qlumfiles, selection_maps=selnfiles, binned=binned, pnum=[3,4,3,3])
 
     g = np.array([-7.95061036, 1.15284665, -0.12037541,
                   -18.64592897, -4.52638114, 0.47207865, -0.01890026,
@@ -114,7 +119,7 @@ elif case == 1:
     
 elif case == 2:
 
-    lfg = lf(quasar_files=qlumfiles, selection_maps=selnfiles, pnum=[3,4,2,5])
+    lfg = lf(quasar_files=qlumfiles, selection_maps=selnfiles, binned=binned, pnum=[3,4,2,5])
 
     g = np.array([-7.95061036, 1.15284665, -0.12037541,
                   -18.64592897, -4.52638114, 0.47207865, -0.01890026,
@@ -142,7 +147,7 @@ elif case == 2:
 
 elif case == 3:
 
-    lfg = lf(quasar_files=qlumfiles, selection_maps=selnfiles, pnum=[3,4,2,4])
+    lfg = lf(quasar_files=qlumfiles, selection_maps=selnfiles, binned=binned, pnum=[3,4,2,4])
 
     g = np.array([-7.95061036, 1.15284665, -0.12037541,
                   -18.64592897, -4.52638114, 0.47207865, -0.01890026,
@@ -175,7 +180,7 @@ elif case == 3:
     
 elif case == 4:
 
-    lfg = lf(quasar_files=qlumfiles, selection_maps=selnfiles, pnum=[3,4,2,3])
+    lfg = lf(quasar_files=qlumfiles, selection_maps=selnfiles, binned=binned, pnum=[3,4,2,3])
 
     g = np.array([-7.95061036, 1.15284665, -0.12037541,
                   -18.64592897, -4.52638114, 0.47207865, -0.01890026,
@@ -193,7 +198,7 @@ elif case == 4:
 
 elif case == 5:
 
-    lfg = lf(quasar_files=qlumfiles, selection_maps=selnfiles, pnum=[3,4,2,2])
+    lfg = lf(quasar_files=qlumfiles, selection_maps=selnfiles, binned=binned, pnum=[3,4,2,2])
 
     g = np.array([-7.95061036, 1.15284665, -0.12037541,
                   -18.64592897, -4.52638114, 0.47207865, -0.01890026,
@@ -206,7 +211,7 @@ elif case == 5:
 
 elif case == 6:
 
-    lfg = lf(quasar_files=qlumfiles, selection_maps=selnfiles, pnum=[3,3,2,5])
+    lfg = lf(quasar_files=qlumfiles, selection_maps=selnfiles, binned=binned, pnum=[3,3,2,5])
 
     g = np.array([-7.95061036, 1.15284665, -0.12037541,
                   -8.03341756,  1.780554,   -0.18695025, 
@@ -219,7 +224,7 @@ elif case == 6:
 
 elif case == 7:
 
-    lfg = lf(quasar_files=qlumfiles, selection_maps=selnfiles, pnum=[3,4,3,3])
+    lfg = lf(quasar_files=qlumfiles, selection_maps=selnfiles, binned=binned, pnum=[3,4,3,3])
 
     g = np.array([-7.95061036, 1.15284665, -0.12037541,
                   -18.64592897, -4.52638114, 0.47207865, -0.01890026,
@@ -232,7 +237,7 @@ elif case == 7:
 
 elif case == 8:
 
-    lfg = lf(quasar_files=qlumfiles, selection_maps=selnfiles, pnum=[3,3,3,3])
+    lfg = lf(quasar_files=qlumfiles, selection_maps=selnfiles, binned=binned, pnum=[3,3,3,3])
 
     g = np.array([-7.95061036, 1.15284665, -0.12037541,
                   -22.58743676,  -1.20805348,   0.02333263,
@@ -245,7 +250,7 @@ elif case == 8:
 
 elif case == 8:
 
-    lfg = lf(quasar_files=qlumfiles, selection_maps=selnfiles, pnum=[3,2,3,3])
+    lfg = lf(quasar_files=qlumfiles, selection_maps=selnfiles, binned=binned, pnum=[3,2,3,3])
 
     g = np.array([-7.95061036, 1.15284665, -0.12037541,
                   -23.26763262,  -0.81679979,
@@ -258,7 +263,7 @@ elif case == 8:
     
 elif case == 9:
 
-    lfg = lf(quasar_files=qlumfiles, selection_maps=selnfiles, pnum=[3,4,2,4])
+    lfg = lf(quasar_files=qlumfiles, selection_maps=selnfiles, binned=binned, pnum=[3,4,2,4])
 
     g = np.array([-7.95061036, 1.15284665, -0.12037541,
                   -18.64592897, -4.52638114, 0.47207865, -0.01890026,
@@ -276,7 +281,7 @@ elif case == 9:
 
 elif case == 10:
 
-    lfg3 = lf_polyb(quasar_files=qlumfiles, selection_maps=selnfiles, pnum=[3,4,2,2])
+    lfg3 = lf_polyb(quasar_files=qlumfiles, selection_maps=selnfiles, binned=binned, pnum=[3,4,2,2])
 
     g = np.array([-7.95061036, 1.15284665, -0.12037541,
                   -18.64592897, -4.52638114, 0.47207865, -0.01890026,
@@ -304,7 +309,7 @@ elif case == 10:
     
 elif case == 11:
 
-    lfg2 = lf(quasar_files=qlumfiles, selection_maps=selnfiles, pnum=[3,4,2,5])
+    lfg2 = lf(quasar_files=qlumfiles, selection_maps=selnfiles, binned=binned, pnum=[3,4,2,5])
 
     g = np.array([-7.95061036, 1.15284665, -0.12037541,
                   -18.64592897, -4.52638114, 0.47207865, -0.01890026,
@@ -333,7 +338,7 @@ elif case == 11:
     
 elif case == 12:
 
-    lfg = lf_polyb(quasar_files=qlumfiles, selection_maps=selnfiles, pnum=[3,4,4,3])
+    lfg = lf_polyb(quasar_files=qlumfiles, selection_maps=selnfiles, binned=binned, pnum=[3,4,4,3])
 
     g = np.array([-7.95061036, 1.15284665, -0.12037541,
                   -18.64592897, -4.52638114, 0.47207865, -0.01890026,
@@ -362,7 +367,7 @@ elif case == 12:
     
 elif case == 13:
 
-    lfg = lf_polyb(quasar_files=qlumfiles, selection_maps=selnfiles, pnum=[3,4,4,4])
+    lfg = lf_polyb(quasar_files=qlumfiles, selection_maps=selnfiles, binned=binned, pnum=[3,4,4,4])
 
     g = np.array([-7.95061036, 1.15284665, -0.12037541,
                   -18.64592897, -4.52638114, 0.47207865, -0.01890026,
@@ -390,7 +395,7 @@ elif case == 13:
 
 elif case == 14:
 
-    lfg = lf_polyb(quasar_files=qlumfiles, selection_maps=selnfiles, pnum=[3,4,4,2])
+    lfg = lf_polyb(quasar_files=qlumfiles, selection_maps=selnfiles, binned=binned, pnum=[3,4,4,2])
 
     g = np.array([-7.95061036, 1.15284665, -0.12037541,
                   -18.64592897, -4.52638114, 0.47207865, -0.01890026,
@@ -418,7 +423,7 @@ elif case == 14:
 
 elif case == 15:
 
-    lfg = lf(quasar_files=qlumfiles, selection_maps=selnfiles, pnum=[3,4,4,5])
+    lfg = lf(quasar_files=qlumfiles, selection_maps=selnfiles, binned=binned, pnum=[3,4,4,5])
 
     g = np.array([-7.95061036, 1.15284665, -0.12037541,
                   -18.64592897, -4.52638114, 0.47207865, -0.01890026,
@@ -444,3 +449,13 @@ elif case == 15:
 
     lfg.run_mcmc()
     
+
+SAVE_POSTERIOR = True
+if SAVE_POSTERIOR:
+    # Plotting and analysis scripts can then use posterior.load
+    # instead of refitting.
+    for name in ('lfg', 'lfg2', 'lfg3'):
+        fit = globals().get(name)
+        if hasattr(fit, 'samples'):
+            posterior.save(fit, 'posteriors/{:s}_case{:d}'.format(name, case),
+                           quasar_files=qlumfiles, selection_maps=selnfiles)
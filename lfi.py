@@ -2,6 +2,8 @@ import sys
 import numpy as np 
 from individual import lf
 import drawlf
+import binfit
+import results
 
 qlumfiles = ['Data_new/dr7z2p2_sample.dat',
              'Data_new/croom09sgp_sample.dat',
@@ -130,11 +132,7 @@ print(bf)
 lfi.get_percentiles()
 
 if WRITE_PARAMS: 
-    with open('new_bins_26jul17_seln.dat', 'a') as f:
-        output = ([lfi.z.mean()] + list(zl) + lfi.phi_star
-                  + lfi.M_star + lfi.alpha + lfi.beta)
-        f.write(('{:.3f}  '*len(output)).format(*output)) 
-        f.write('\n')
+    results.store().put('new_bins_26jul17_seln', binfit.summary(lfi))
 
 lfi.chains()
 lfi.corner_plot()
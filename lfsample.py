@@ -1,5 +1,6 @@
 import numpy as np
 import emcee
+import mcpool
 import matplotlib as mpl
 mpl.use('Agg') 
 mpl.rcParams['text.usetex'] = True 
@@ -13,11 +14,12 @@ cosmo = {'omega_M_0':0.3,
          'omega_k_0':0.0,
          'h':0.70}
 
-def lfsampleComp(theta, composite, n, mlims, zlims):
+def lfsampleComp(theta, composite, n, mlims, zlims, processes=1):
 
     """
     Return n qso magnitudes between mlims[0] and mlims[1] when the LF
-    is described by parameters theta.
+    is described by parameters theta.  With processes > 1, walkers
+    are evaluated in that many worker processes (see mcpool).
 
     """
 
@@ -47,10 +49,18 @@ def lfsampleComp(theta, composite, n, mlims, zlims):
     p0[:,0] = p0[:,0]*dm + mlims[0]
     p0[:,1] = p0[:,1]*dz + zlims[0]
     
-    sampler = emcee.EnsembleSampler(nwalkers, ndim, lnprob, args=[theta])
-    pos, prob, state = sampler.run_mcmc(p0, 100)
-    sampler.reset()
-    sampler.run_mcmc(pos, 1000)
+    if processes != 1:
+        with mcpool.pool(lnprob, processes, vectorized=False) as p:
+            sampler = emcee.EnsembleSampler(nwalkers, ndim, p, args=[theta],
+                                            vectorize=True)
+            pos, prob, state = sampler.run_mcmc(p0, 100)
+            sampler.reset()
+            sampler.run_mcmc(pos, 1000)
+    else:
+        sampler = emcee.EnsembleSampler(nwalkers, ndim, lnprob, args=[theta])
+        pos, prob, state = sampler.run_mcmc(p0, 100)
+        sampler.reset()
+        sampler.run_mcmc(pos, 1000)
 
     idx = np.random.randint(nwalkers*1000, size=n)
     
@@ -59,11 +69,12 @@ def lfsampleComp(theta, composite, n, mlims, zlims):
 
     return ms, zs
     
-def lfsampleIdvl(theta, individual, n, mlims):
+def lfsampleIdvl(theta, individual, n, mlims, processes=1):
 
     """
     Return n qso magnitudes between mlims[0] and mlims[1] when the LF
-    is described by parameters theta.
+    is described by parameters theta.  processes is as for
+    lfsampleComp.
 
     """
 
@@ -82,10 +93,18 @@ def lfsampleIdvl(theta, individual, n, mlims):
     dm = np.abs(mmin-mmax)
     p0 = (np.random.rand(ndim*nwalkers)*dm + mmin).reshape((nwalkers, ndim))
 
-    sampler = emcee.EnsembleSampler(nwalkers, ndim, lnprob, args=[theta])
-    pos, prob, state = sampler.run_mcmc(p0, 100)
-    sampler.reset()
-    sampler.run_mcmc(pos, 1000)
+    if processes != 1:
+        with mcpool.pool(lnprob, processes, vectorized=False) as p:
+            sampler = emcee.EnsembleSampler(nwalkers, ndim, p, args=[theta],
+                                            vectorize=True)
+            pos, prob, state = sampler.run_mcmc(p0, 100)
+            sampler.reset()
+            sampler.run_mcmc(pos, 1000)
+    else:
+        sampler = emcee.EnsembleSampler(nwalkers, ndim, lnprob, args=[theta])
+        pos, prob, state = sampler.run_mcmc(p0, 100)
+        sampler.reset()
+        sampler.run_mcmc(pos, 1000)
 
     sample = sampler.flatchain[:,0]
 
@@ -10,6 +10,7 @@ from astropy.stats import knuth_bin_width  as kbw
 from astropy.stats import poisson_conf_interval as pci
 from scipy.stats import binned_statistic as bs
 import cosmolopy.distance as cd
+import catalogue
 cosmo = {'omega_M_0':0.3,
          'omega_lambda_0':0.7,
          'omega_k_0':0.0,
@@ -55,7 +56,7 @@ def binvol(m, zrange, bins, msel, psel, vsel, zsel):
 
 def get_lf(zrange, bins):
 
-    z, m, p = np.loadtxt('Data/mcgreer13_dr7sample2.dat', usecols=(1, 2, 3), unpack=True)
+    z, m, p = catalogue.loadcols('Data/mcgreer13_dr7sample2.dat', (1, 2, 3))
     select = ((z>=zrange[0]) & (z<zrange[1]))
     m = m[select]
     p = p[select]
@@ -63,10 +64,10 @@ def get_lf(zrange, bins):
     area = 6222.0 # deg^2
     dz = 0.05 
     dm = 0.1
-    zsel, msel, psel = np.loadtxt('Data/mcgreer13_dr7selfunc2.dat', usecols=(1, 2, 3), unpack=True)
+    zsel, msel, psel = catalogue.loadcols('Data/mcgreer13_dr7selfunc2.dat', (1, 2, 3))
     vol = volume(zsel, area)*dz
 
-    psel[(zsel < zrange[0]) | (zsel >= zrange[1])] = 0.0
+    psel = np.where((zsel < zrange[0]) | (zsel >= zrange[1]), 0.0, psel)
 
 
     v1 = np.array([binvol(x, zrange, bins, msel, psel, vol, zsel) for x in m])
@@ -100,7 +101,7 @@ def get_lf(zrange, bins):
 
 def get_lf_s82(zrange, bins):
 
-    z, m, p = np.loadtxt('Data/mcgreer13_s82sample2.dat', usecols=(1, 2, 3), unpack=True)
+    z, m, p = catalogue.loadcols('Data/mcgreer13_s82sample2.dat', (1, 2, 3))
     select = ((z>=zrange[0]) & (z<zrange[1]))
     m = m[select]
     p = p[select]
@@ -108,10 +109,10 @@ def get_lf_s82(zrange, bins):
     area = 235.0 # deg^2
     dz = 0.05 
     dm = 0.1
-    zsel, msel, psel = np.loadtxt('Data/mcgreer13_s82selfunc2.dat', usecols=(1, 2, 3), unpack=True)
+    zsel, msel, psel = catalogue.loadcols('Data/mcgreer13_s82selfunc2.dat', (1, 2, 3))
     vol = volume(zsel, area)*dz
 
-    psel[(zsel < zrange[0]) | (zsel >= zrange[1])] = 0.0
+    psel = np.where((zsel < zrange[0]) | (zsel >= zrange[1]), 0.0, psel)
 
     v1 = np.array([binvol(x, zrange, bins, msel, psel, vol, zsel) for x in m])
 
@@ -0,0 +1,170 @@
+import os
+import itertools
+import multiprocessing
+import numpy as np
+
+"""
+
+Process pool for emcee whose workers share the likelihood's data.
+
+The pool forks its workers after the log-probability function has
+been registered here, so each worker inherits the function together
+with the catalogue and selection-map arrays it refers to.  These pages
+are shared copy-on-write with the parent and are never pickled; each
+step only sends the walker positions to the workers and the lnprob
+values back.
+
+An instance is used as a vectorised lnprob:
+
+    with mcpool.pool(lf.lnprob_batch, processes=16) as p:
+        sampler = emcee.EnsembleSampler(nwalkers, ndim, p, vectorize=True)
+        sampler.run_mcmc(pos, 1000)
+
+The walkers of each step are split into one block per worker.  Each
+block is evaluated with a single call to a vectorised function such as
+lf.lnprob_batch, or walker by walker for a function of one theta
+(vectorized=False).
+
+Workers are started with the 'fork' method, which is the default on
+Linux.  Run this file for a scaling benchmark with the composite model.
+
+"""
+
+# Functions registered by open pools, keyed by pool.  They must be
+# here before the workers are forked.
+_registry = {}
+_keys = itertools.count()
+
+def _evaluate(args):
+
+    """Evaluate one block of walkers in a worker process."""
+
+    key, thetas, extra = args
+    fn, vectorized = _registry[key]
+
+    if vectorized:
+        return np.asarray(fn(thetas, *extra), dtype=float)
+
+    return np.array([fn(theta, *extra) for theta in thetas], dtype=float)
+
+class pool:
+
+    """Evaluate lnprob for blocks of walkers in worker processes.
+
+    fn takes an (ntheta, ndim) array and returns ntheta values, or, if
+    vectorized is False, takes one theta and returns one value.  With
+    processes=None, all CPUs are used.
+
+    """
+
+    def __init__(self, fn, processes=None, vectorized=True):
+
+        if processes is None:
+            processes = os.cpu_count()
+
+        self.processes = processes
+        self.key = next(_keys)
+        _registry[self.key] = (fn, vectorized)
+
+        context = multiprocessing.get_context('fork')
+        self.workers = context.Pool(processes)
+
+        return
+
+    def __call__(self, thetas, *args):
+
+        thetas = np.atleast_2d(thetas)
+        blocks = np.array_split(thetas, min(self.processes, len(thetas)))
+
+        results = self.workers.map(_evaluate,
+                                   [(self.key, b, args) for b in blocks],
+                                   chunksize=1)
+
+        return np.concatenate(results)
+
+    def close(self):
+
+        self.workers.close()
+        self.workers.join()
+        _registry.pop(self.key, None)
+
+        return
+
+    def __enter__(self):
+
+        return self
+
+    def __exit__(self, *exc):
+
+        self.close()
+
+        return False
+
+if __name__ == '__main__':
+
+    import time
+    import emcee
+    from composite import lf
+
+    qlumfiles = ['Data_new/dr7z2p2_sample.dat',
+                 'Data_new/croom09sgp_sample.dat',
+                 'Data_new/croom09ngp_sample.dat',
+                 'Data_new/dr7z3p7_sample.dat',
+                 'Data_new/glikman11debug.dat',
+                 'Data_new/yang16_sample.dat',
+                 'Data_new/mcgreer13_dr7sample.dat',
+                 'Data_new/mcgreer13_s82sample.dat',
+                 'Data_new/mcgreer13_dr7extend.dat',
+                 'Data_new/mcgreer13_s82extend.dat',
+                 'Data_new/jiang16main_sample.dat',
+                 'Data_new/jiang16overlap_sample.dat',
+                 'Data_new/jiang16s82_sample.dat',
+                 'Data_new/willott10_cfhqsdeepsample.dat',
+                 'Data_new/willott10_cfhqsvwsample.dat',
+                 'Data_new/kashikawa15_sample.dat']
+
+    selnfiles = [('Selmaps_with_tiles/dr7z2p2_selfunc.dat', 6248.0, 13),
+                 ('Selmaps_with_tiles/croom09sgp_selfunc.dat', 64.2, 15),
+                 ('Selmaps_with_tiles/croom09ngp_selfunc.dat', 127.7, 15),
+                 ('Selmaps_with_tiles/dr7z3p7_selfunc.dat', 6248.0, 13),
+                 ('Selmaps_with_tiles/glikman11_selfunc_ndwfs.dat', 1.71, 6),
+                 ('Selmaps_with_tiles/glikman11_selfunc_dls.dat', 2.05, 6),
+                 ('Selmaps_with_tiles/yang16_sel.dat', 14555.0, 17),
+                 ('Selmaps_with_tiles/mcgreer13_dr7selfunc.dat', 6248.0, 8),
+                 ('Selmaps_with_tiles/mcgreer13_s82selfunc.dat', 235.0, 8),
+                 ('Selmaps_with_tiles/jiang16main_selfunc.dat', 11240.0, 18),
+                 ('Selmaps_with_tiles/jiang16overlap_selfunc.dat', 4223.0, 18),
+                 ('Selmaps_with_tiles/jiang16s82_selfunc.dat', 277.0, 18),
+                 ('Selmaps_with_tiles/willott10_cfhqsdeepsel.dat', 4.47, 10),
+                 ('Selmaps_with_tiles/willott10_cfhqsvwsel.dat', 494.0, 10),
+                 ('Selmaps_with_tiles/kashikawa15_sel.dat', 6.5, 11)]
+
+    lfg = lf(quasar_files=qlumfiles, selection_maps=selnfiles, pnum=[3,4,2,5])
+
+    g = np.array([-7.95061036, 1.15284665, -0.12037541,
+                  -18.64592897, -4.52638114, 0.47207865, -0.01890026,
+                  -3.35945526, -0.26211017,
+                  -2.47899576, 0.978408, 3.76233908, 10.96715636, -0.33557835])
+    lfg.prior_min_values = g - 10.0*np.abs(g)
+    lfg.prior_max_values = g + 10.0*np.abs(g)
+
+    ndim, nwalkers, nsteps = g.size, 128, 20
+    pos = g + 1e-4*np.random.randn(nwalkers, ndim)
+
+    start = time.time()
+    sampler = emcee.EnsembleSampler(nwalkers, ndim, lfg.lnprob_batch,
+                                    vectorize=True)
+    sampler.run_mcmc(pos, nsteps)
+    serial = nsteps/(time.time()-start)
+    print('serial: {:.2f} steps/s'.format(serial))
+
+    n = 1
+    while n <= os.cpu_count():
+        with pool(lfg.lnprob_batch, processes=n) as p:
+            start = time.time()
+            sampler = emcee.EnsembleSampler(nwalkers, ndim, p, vectorize=True)
+            sampler.run_mcmc(pos, nsteps)
+            rate = nsteps/(time.time()-start)
+        print('{:3d} workers: {:.2f} steps/s, speedup {:.2f}'.format(n, rate,
+                                                                   rate/serial))
+        n *= 2
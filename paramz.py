@@ -1,25 +1,163 @@
-import numpy as np 
+import os
+import hashlib
+import numpy as np
+import dplint
+
+"""
+
+Double-power-law parameters (log10 phi*, M*, alpha, beta) of a fitted
+model at many redshifts, for many posterior draws at once.
+
+evaluate returns a (4, ndraws, nz) array.  Models whose parameters
+evolve with redshift (composite.lf, composite.lf_polyb) tabulate the
+Chebyshev basis of the redshift grid first (tabulate_zbasis) and pass
+it to dplparams, so that each parameter is one matrix product per
+block of draws; the model itself is not changed.  An individual.lf
+has the same parameters at all z.  percentiles reduces
+over the draws:
+
+    values = paramz.posterior(lfg, z, nsample=10000)
+    down, median, up = paramz.percentiles(values)   # each (4, nz)
+    ax.fill_between(z, down[3], y2=up[3])
+
+posterior can keep its result in the archive directory of lf (see
+posterior.py); the file name records the redshift grid, the draws and
+the samples file, so a cache is not reused after the archive is saved
+again.
+
+"""
+
+def draws(lf, nsample=1000, seed=None):
+
+    """nsample rows of lf.samples drawn at random, or all if nsample is None."""
+
+    if nsample is None:
+        return np.asarray(lf.samples)
+
+    rng = np.random.RandomState(seed)
+
+    return lf.samples[np.sort(rng.randint(len(lf.samples), size=nsample))]
+
+def evaluate(lf, thetas, z):
+
+    """DPL parameters of lf for each row of thetas and each z.
+
+    Returns an array of shape (4, len(thetas), len(z)).
+
+    """
+
+    thetas = np.atleast_2d(thetas)
+    z = np.atleast_1d(np.asarray(z, dtype=float))
+
+    basis = None
+    if hasattr(lf, 'tabulate_zbasis'):
+        basis = lf.tabulate_zbasis(z)
+
+    result = np.empty((4, len(thetas), z.size))
+    chunk = max(1, dplint.max_batch_elements//z.size)
+
+    for i in range(0, len(thetas), chunk):
+        result[:, i:i+chunk] = dplint.dplparams_grid(lf, thetas[i:i+chunk], z,
+                                                     basis)
+
+    return result
+
+def percentiles(values, q=(15.87, 50.0, 84.13)):
+
+    """Percentiles q over the draws (axis 1) of an evaluate result.
+
+    Returns an array of shape (len(q), 4, nz).
+
+    """
+
+    return np.percentile(values, q, axis=1)
+
+def cachefile(dirname, z, nsample, seed):
+
+    """Name of the cache file in the archive dirname for these arguments."""
+
+    info = os.stat(os.path.join(dirname, 'samples.npy'))
+
+    key = hashlib.sha1()
+    key.update(np.ascontiguousarray(z, dtype=float).tobytes())
+    key.update(repr((nsample, seed, info.st_size, info.st_mtime_ns)).encode())
+
+    return os.path.join(dirname, 'paramz.{:s}.npy'.format(key.hexdigest()[:16]))
+
+def posterior(lf, z, nsample=1000, seed=None, cache=None):
+
+    """evaluate for nsample random posterior draws (all if None).
+
+    cache is the archive directory lf was loaded from.  If given, the
+    result is read from there when present and written there
+    otherwise; the draws then default to seed 0 so that they can be
+    reproduced.
+
+    """
+
+    z = np.atleast_1d(np.asarray(z, dtype=float))
+
+    if cache is None:
+        return evaluate(lf, draws(lf, nsample, seed), z)
+
+    if seed is None:
+        seed = 0
+
+    filename = cachefile(cache, z, nsample, seed)
+    if os.path.exists(filename):
+        return np.load(filename)
+
+    values = evaluate(lf, draws(lf, nsample, seed), z)
+
+    tmpfile = '{:s}.{:d}.tmp'.format(filename, os.getpid())
+    with open(tmpfile, 'wb') as f:
+        np.save(f, values)
+    os.replace(tmpfile, filename)
+
+    return values
 
 def parameter_atz(lf, z, param_number):
+
     """Return value of one of phi*, M*, alpha, and beta at redshift z for
     luminosity function lf.
 
-    param_number sould be 0, 1, 2, 3 for phi*, M*, alpha, beta.
+    param_number sould be 0, 1, 2, 3 for phi*, M*, alpha, beta.  The
+    value is the median over 1000 posterior draws.
 
     """
-    
-    np.random.seed()
-    nsample = 1000
-    rsample = lf.samples[np.random.randint(len(lf.samples), size=nsample)]
-    
-    prm = np.zeros(nsample)
-    for i, theta in enumerate(rsample):
-        params = lf.getparams(theta)
-        if param_number == 3 and len(theta) > 11:
-            prm[i] = lf.atz_beta(z, params[param_number])
-        else:
-            prm[i] = lf.atz(z, params[param_number])
-
-    best_fit = np.median(prm)
-    
-    return best_fit 
+
+    values = posterior(lf, z, nsample=1000)
+
+    return np.median(values[param_number, :, 0])
+
+if __name__ == '__main__':
+
+    import sys
+    import time
+    import posterior as archive
+
+    # Compare with the loop over draws used before, for each archive
+    # saved by posterior.save, e.g. of a composite.lf and of a
+    # composite.lf_polyb:
+    #
+    #     python paramz.py posteriors/lfg_case0 posteriors/lfg_polyb
+    z = np.linspace(0.0, 7.0, num=500)
+
+    for dirname in sys.argv[1:]:
+
+        lf = archive.load(dirname)
+        thetas = draws(lf, 1000, seed=1)
+
+        t0 = time.time()
+        loop = np.zeros((4, len(thetas), z.size))
+        for i, theta in enumerate(thetas):
+            loop[:, i] = np.reshape(lf.dplparams(theta, z), (4, -1))
+        t_loop = time.time() - t0
+
+        t0 = time.time()
+        values = evaluate(lf, thetas, z)
+        t_batch = time.time() - t0
+
+        print('{:s} ({:s})'.format(dirname, type(lf).__name__))
+        print('  loop: {:.3g} s, batched: {:.3g} s'.format(t_loop, t_batch))
+        print('  max difference: {:.2e}'.format(np.max(np.abs(values - loop))))
@@ -0,0 +1,140 @@
+import os
+import types
+import importlib
+import numpy as np
+import scipy.optimize as op
+
+"""
+
+Archive of posterior samples, for analysis without refitting.
+
+save writes a fitted lf (individual.lf, composite.lf or
+composite.lf_polyb) to a directory holding
+
+    samples.npy   the MCMC samples, stored raw so that load can
+                  memory-map them instead of reading them;
+    model.npz     compressed: the class of the model, pnum, zlims,
+                  best fit, priors, the survey and sample lists, and
+                  the quasar and selection-map arrays that the
+                  likelihood uses (see ARRAYS).
+
+load rebuilds an object of the saved class from these without reading
+any catalogue or selection map, so its log10phi, getparams, atz,
+lfnorm, neglnlike and lnprob are those of the fitted model:
+
+    lfg = posterior.load('posteriors/lfg_case0')
+    gammapi.plot_gamma(lfg)
+
+Importing the saved class takes seconds, since composite.py imports
+matplotlib and emcee.  A script that only needs the samples or the
+best fit can skip it with load(dirname, lazy=True).
+
+The selmap objects themselves are not kept, so methods that loop over
+lf.maps (drawlf.draw, the binned LF points) still need the live lf.
+
+"""
+
+# Arrays of an lf that are saved when present.
+ARRAYS = ('z', 'M1450', 'p', 'area', 'sid',
+          'data_m', 'data_z', 'data_n',
+          'tile_m', 'tile_z', 'tile_w', 'tile_sid',
+          'prior_min_values', 'prior_max_values')
+
+def save(lf, dirname, quasar_files=None, selection_maps=None):
+
+    """Write lf and its samples to the archive dirname.
+
+    quasar_files and selection_maps, the arguments lf was built with,
+    are recorded for reference.
+
+    """
+
+    os.makedirs(dirname, exist_ok=True)
+
+    meta = {'kind': '{:s}.{:s}'.format(type(lf).__module__,
+                                       type(lf).__name__),
+            'bf': lf.bf.x,
+            'map_sids': [x.sid for x in getattr(lf, 'maps', [])]}
+
+    for name in ARRAYS:
+        if hasattr(lf, name):
+            meta[name] = getattr(lf, name)
+
+    for name in ('pnum', 'zlims', 'binned'):
+        if getattr(lf, name, None) is not None:
+            meta[name] = getattr(lf, name)
+
+    if quasar_files is not None:
+        meta['quasar_files'] = list(quasar_files)
+    if selection_maps is not None:
+        meta['selection_maps'] = [str(x[0]) for x in selection_maps]
+
+    # Write under temporary names and rename, samples first, so that
+    # a reader never sees a half-written archive.
+    tmpfile = os.path.join(dirname, 'samples.{:d}.tmp'.format(os.getpid()))
+    with open(tmpfile, 'wb') as f:
+        np.save(f, np.ascontiguousarray(lf.samples))
+    os.replace(tmpfile, os.path.join(dirname, 'samples.npy'))
+
+    tmpfile = os.path.join(dirname, 'model.{:d}.tmp'.format(os.getpid()))
+    with open(tmpfile, 'wb') as f:
+        np.savez_compressed(f, **meta)
+    os.replace(tmpfile, os.path.join(dirname, 'model.npz'))
+
+    return
+
+def load(dirname, mmap=True, lazy=False):
+
+    """The lf saved in the archive dirname, with its samples.
+
+    With mmap=True the samples are memory-mapped read-only.  With
+    lazy=True the saved class is not imported and the result is a
+    plain namespace holding only samples, bf and pnum.
+
+    """
+
+    with np.load(os.path.join(dirname, 'model.npz')) as data:
+        meta = {k: data[k] for k in data.files}
+
+    samples = np.load(os.path.join(dirname, 'samples.npy'),
+                      mmap_mode='r' if mmap else None)
+
+    if 'pnum' in meta and meta['pnum'].ndim == 0:
+        meta['pnum'] = int(meta['pnum'])
+
+    if lazy:
+        return types.SimpleNamespace(samples=samples,
+                                     bf=types.SimpleNamespace(x=meta['bf']),
+                                     pnum=meta.get('pnum'))
+
+    module, name = str(meta.pop('kind')).rsplit('.', 1)
+    cls = getattr(importlib.import_module(module), name)
+
+    # Bypass __init__, which reads the catalogues.
+    lf = cls.__new__(cls)
+
+    lf.bf = op.OptimizeResult(x=meta.pop('bf'))
+
+    for key in ('quasar_files', 'selection_maps', 'map_sids'):
+        if key in meta:
+            meta[key] = meta[key].tolist()
+    if 'zlims' in meta:
+        meta['zlims'] = tuple(meta['zlims'].tolist())
+    if 'binned' in meta:
+        meta['binned'] = bool(meta['binned'])
+
+    lf.__dict__.update(meta)
+
+    if 'zlims' in meta:
+        lf.dz = lf.zlims[1]-lf.zlims[0]
+
+    lf.samples = samples
+    lf.ndim = lf.samples.shape[1]
+
+    if hasattr(lf, 'tabulate_zbases'):
+        lf.tabulate_zbases()
+
+    if hasattr(lf, 'get_percentiles'):
+        lf.get_percentiles()
+
+    return lf
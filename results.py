@@ -0,0 +1,202 @@
+import os
+import glob
+import time
+import socket
+import numpy as np
+
+"""
+
+Store for the results of luminosity function fits.
+
+Each fit of one model in one redshift bin is a record of record_dtype
+(percentiles, best fit and run metadata) written to its own file,
+
+    RESULTS_DIR/<model>/z<zmin>-<zmax>.npy
+
+Files are written under a temporary name and renamed, so any number
+of processes can write at once and a reader never sees a partial
+record.  Refitting a bin replaces its record.  store.table reads all
+records of a model (or of every model) into one structured array:
+
+    s = results.store()
+    s.put('bins', binfit.summary(lfi))
+    t = s.table('bins')
+    t['M_star'][:, 2]
+
+load and getparam fall back to the text files <model>.dat that the
+bins scripts used to append to, for models that have no records in
+the store.
+
+"""
+
+RESULTS_DIR = os.environ.get('QLF_RESULTS_DIR',
+                             os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                          'results'))
+
+# Result of a fit in one bin.  Percentiles are (15.87, 84.13, 50) as
+# returned by individual.percentiles.  nfev counts the likelihood
+# evaluations of the optimiser; warm is set for warm-started fits
+# (see binfit.fit_bins).
+fit_dtype = np.dtype([('z', 'f8'),
+                      ('zmin', 'f8'),
+                      ('zmax', 'f8'),
+                      ('nqso', 'i8'),
+                      ('bestfit', 'f8', (4,)),
+                      ('phi_star', 'f8', (3,)),
+                      ('M_star', 'f8', (3,)),
+                      ('alpha', 'f8', (3,)),
+                      ('beta', 'f8', (3,)),
+                      ('tau', 'f8', (4,)),
+                      ('nsteps', 'i8'),
+                      ('converged', '?'),
+                      ('nfev', 'i8'),
+                      ('warm', '?')])
+
+# A stored record: the model, the fit, and when and where it was run.
+record_dtype = np.dtype([('model', 'U32')] + fit_dtype.descr +
+                        [('time', 'f8'), ('host', 'U64'), ('pid', 'i8')])
+
+PARAMS = ('phi_star', 'M_star', 'alpha', 'beta')
+
+class store:
+
+    def __init__(self, dirname=RESULTS_DIR):
+
+        self.dirname = dirname
+
+        return
+
+    def directory(self, model):
+
+        """Directory holding the records of model."""
+
+        if not model or os.sep in model or model.startswith('.'):
+            raise ValueError('invalid model name {!r}'.format(model))
+
+        return os.path.join(self.dirname, model)
+
+    def filename(self, model, zlims):
+
+        """File holding the record of model in the bin zlims."""
+
+        name = 'z{:.4f}-{:.4f}.npy'.format(*zlims)
+
+        return os.path.join(self.directory(model), name)
+
+    def put(self, model, fit):
+
+        """Write the result fit (of fit_dtype) of model; returns the record."""
+
+        record = np.zeros((), dtype=record_dtype)
+        for name in fit.dtype.names:
+            record[name] = fit[name]
+
+        record['model'] = model
+        record['time'] = time.time()
+        record['host'] = socket.gethostname()
+        record['pid'] = os.getpid()
+
+        filename = self.filename(model, (record['zmin'], record['zmax']))
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+
+        tmpfile = '{:s}.{:s}.{:d}.tmp'.format(filename, socket.gethostname(),
+                                             os.getpid())
+        with open(tmpfile, 'wb') as f:
+            np.save(f, record)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmpfile, filename)
+
+        return record
+
+    def get(self, model, zlims):
+
+        """The record of model in the bin zlims."""
+
+        try:
+            return np.load(self.filename(model, zlims))
+        except(FileNotFoundError):
+            raise KeyError((model, tuple(zlims)))
+
+    def models(self):
+
+        """Names of the models with stored records."""
+
+        try:
+            names = os.listdir(self.dirname)
+        except(FileNotFoundError):
+            return []
+
+        return sorted([x for x in names
+                       if os.path.isdir(os.path.join(self.dirname, x))])
+
+    def table(self, model=None):
+
+        """All records of model (or of every model), sorted by model and z."""
+
+        if model is None:
+            pattern = os.path.join(self.dirname, '*', 'z*.npy')
+        else:
+            pattern = os.path.join(self.directory(model), 'z*.npy')
+
+        files = glob.glob(pattern)
+        t = np.zeros(len(files), dtype=record_dtype)
+
+        # Copy by name, so that records written before a field was
+        # added can still be read.
+        for i, f in enumerate(files):
+            record = np.load(f)
+            for name in record.dtype.names:
+                if name in record_dtype.names:
+                    t[i][name] = record[name]
+
+        return np.sort(t, order=['model', 'zmin', 'zmax'])
+
+def read_dat(filename):
+
+    """Read a text file written by the bins scripts into fit_dtype.
+
+    Each line has z, zmin, zmax and the three percentiles of each of
+    phi_star, M_star, alpha and beta.  Fields that the file does not
+    hold are NaN.
+
+    """
+
+    data = np.loadtxt(filename, ndmin=2)
+
+    t = np.zeros(len(data), dtype=fit_dtype)
+    for name in ('bestfit', 'tau'):
+        t[name] = np.nan
+
+    t['z'], t['zmin'], t['zmax'] = data[:, 0], data[:, 1], data[:, 2]
+    for i, name in enumerate(PARAMS):
+        t[name] = data[:, 3+3*i:6+3*i]
+
+    return t
+
+def load(model, s=None):
+
+    """All results of model, sorted by z.
+
+    Records are read from the store s (by default, the one in
+    RESULTS_DIR); models without records are read from <model>.dat.
+
+    """
+
+    if s is None:
+        s = store()
+
+    t = s.table(model)
+    if t.size == 0:
+        t = read_dat(model + '.dat')
+
+    return t
+
+def getparam(model, param, s=None):
+
+    """zmean, zl, zu and the percentiles of parameter param of model."""
+
+    t = load(model, s)
+    p = t[PARAMS[param]]
+
+    return t['z'], t['zmin'], t['zmax'], p[:, 0], p[:, 1], p[:, 2]
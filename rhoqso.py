@@ -7,6 +7,7 @@ mpl.rcParams['font.serif'] = 'cm'
 mpl.rcParams['font.size'] = '22'
 import matplotlib.pyplot as plt
 import fit_emissivity
+import dplint
 
 def f(loglf, theta, m, z, fit='individual'):
 
@@ -17,6 +18,11 @@ def f(loglf, theta, m, z, fit='individual'):
 
 def rhoqso(loglf, theta, mlim, z, fit='individual', mbright=-35.0):
 
+    params = dplint.dplparams(loglf, theta, z)
+    if params is not None:
+        # Exact; see dplint.
+        return dplint.density(mbright, mlim, *params) # cMpc^-3
+
     m = np.linspace(mbright, mlim, num=1000)
     if fit == 'composite':
         farr = f(loglf, theta, m, z, fit='composite')
@@ -25,12 +31,27 @@ def rhoqso(loglf, theta, mlim, z, fit='individual', mbright=-35.0):
     
     return np.trapz(farr, m) # cMpc^-3
 
+def density_bands(lf, mlim, z, mbright=-35.0, nsample=300,
+                  q=(15.87, 50.0, 84.13)):
+
+    """Percentiles q of rhoqso over nsample posterior draws of lf.
+
+    Returns an array of shape (len(q), len(z)); all draws and
+    redshifts are integrated together (see dplint.grid).  With the
+    default mbright this is the cumulative density brighter than
+    mlim, otherwise the density between mbright and mlim.
+
+    """
+
+    rsample = lf.samples[np.random.randint(len(lf.samples), size=nsample)]
+    r = dplint.density_grid(lf, rsample, z, mbright, mlim) # cMpc^-3
+
+    return np.percentile(r, q, axis=0)
+
 def get_rhoqso(lfi, mlim, z, fit='individual', mbright=-35.0):
 
     rindices = np.random.randint(len(lfi.samples), size=300)
-    n = np.array([rhoqso(lfi.log10phi, theta, mlim, z, mbright=mbright) 
-                  for theta
-                  in lfi.samples[rindices]])
+    n = dplint.density_grid(lfi, lfi.samples[rindices], z, mbright, mlim)[:, 0]
     u = np.percentile(n, 15.87) 
     l = np.percentile(n, 84.13)
     c = np.mean(n)
@@ -197,23 +218,14 @@ def global_cumulative(ax, composite, mlim, color, **kwargs):
 
     nzs = 500
     z = np.linspace(0, 7, nzs)
-    nsample = 300
-    rsample = composite.samples[np.random.randint(len(composite.samples), size=nsample)]
 
     # bf = np.median(composite.samples, axis=0)
     # r = np.array([rhoqso(composite.log10phi, bf, mlim, x, fit='composite') for x in z])
     # ax.plot(z, r, color='k', zorder=7)
 
-    r = np.zeros((nsample, nzs))
-    for i, theta in enumerate(rsample):
-        r[i] = np.array([rhoqso(composite.log10phi, theta, mlim, x, fit='composite') for x in z])
-
-    up = np.percentile(r, 15.87, axis=0)
-    down = np.percentile(r, 84.13, axis=0)
+    up, c, down = density_bands(composite, mlim, z)
     f = ax.fill_between(z, down, y2=up, color=color, zorder=6, alpha=0.7, **kwargs)
 
-    c = np.median(r, axis=0)
-
     if color == 'forestgreen':
         p, = ax.plot(z, c, color=color, zorder=7)
     
@@ -230,19 +242,13 @@ def global_differential(ax, composite, mbright, mfaint, color):
 
     nzs = 50 
     z = np.linspace(0, 7, nzs)
-    nsample = 300
-    rsample = composite.samples[np.random.randint(len(composite.samples), size=nsample)]
 
     bf = np.median(composite.samples, axis=0)
-    r = np.array([rhoqso(composite.log10phi, bf, mfaint, x, mbright=mbright, fit='composite') for x in z])
+    r = dplint.density_grid(composite, bf, z, mbright, mfaint)[0]
     ax.plot(z, r, color='k', zorder=7)
 
-    r = np.zeros((nsample, nzs))
-    for i, theta in enumerate(rsample):
-        r[i] = np.array([rhoqso(composite.log10phi, theta, mfaint, x, mbright=mbright, fit='composite') for x in z])
-
-    up = np.percentile(r, 15.87, axis=0)
-    down = np.percentile(r, 84.13, axis=0)
+    up, down = density_bands(composite, mfaint, z, mbright=mbright,
+                             q=(15.87, 84.13))
 
     label = '${:d}>M>{:d}$'.format(mfaint, mbright) 
     ax.fill_between(z, down, y2=up, color=color, zorder=6, alpha=0.5, label=label, linewidth=0)
@@ -895,8 +901,8 @@ def draw_onlyGlobal(composite):
     r = np.array([rhoqso(composite.log10phi, bf, mlim, x, fit='composite') for x in z])
     ax.plot(z, r, color='k', zorder=7)
 
-    for theta in composite.samples[np.random.randint(len(composite.samples), size=900)]:
-        r = np.array([rhoqso(composite.log10phi, theta, mlim, x, fit='composite') for x in z])
+    rsample = composite.samples[np.random.randint(len(composite.samples), size=900)]
+    for r in dplint.density_grid(composite, rsample, z, -35.0, mlim):
         ax.plot(z, r, color='tomato', zorder=6, alpha=0.02)
     
 
@@ -909,8 +915,8 @@ def draw_onlyGlobal(composite):
     r = np.array([rhoqso(composite.log10phi, bf, mlim, x, fit='composite') for x in z])
     ax.plot(z, r, color='k', zorder=7)
 
-    for theta in composite.samples[np.random.randint(len(composite.samples), size=900)]:
-        r = np.array([rhoqso(composite.log10phi, theta, mlim, x, fit='composite') for x in z])
+    rsample = composite.samples[np.random.randint(len(composite.samples), size=900)]
+    for r in dplint.density_grid(composite, rsample, z, -35.0, mlim):
         ax.plot(z, r, color='forestgreen', zorder=6, alpha=0.02)
     
 
@@ -923,8 +929,8 @@ def draw_onlyGlobal(composite):
     r = np.array([rhoqso(composite.log10phi, bf, mlim, x, fit='composite') for x in z])
     ax.plot(z, r, color='k', zorder=7)
 
-    for theta in composite.samples[np.random.randint(len(composite.samples), size=900)]:
-        r = np.array([rhoqso(composite.log10phi, theta, mlim, x, fit='composite') for x in z])
+    rsample = composite.samples[np.random.randint(len(composite.samples), size=900)]
+    for r in dplint.density_grid(composite, rsample, z, -35.0, mlim):
         ax.plot(z, r, color='goldenrod', zorder=6, alpha=0.02)
 
     
@@ -937,8 +943,8 @@ def draw_onlyGlobal(composite):
     r = np.array([rhoqso(composite.log10phi, bf, mlim, x, fit='composite') for x in z])
     ax.plot(z, r, color='k', zorder=7)
 
-    for theta in composite.samples[np.random.randint(len(composite.samples), size=900)]:
-        r = np.array([rhoqso(composite.log10phi, theta, mlim, x, fit='composite') for x in z])
+    rsample = composite.samples[np.random.randint(len(composite.samples), size=900)]
+    for r in dplint.density_grid(composite, rsample, z, -35.0, mlim):
         ax.plot(z, r, color='saddlebrown', zorder=6, alpha=0.02)
     
     plt.legend(loc='upper left', fontsize=14, handlelength=1,
@@ -10,6 +10,7 @@ import matplotlib.pyplot as plt
 from astropy.stats import knuth_bin_width  as kbw
 from astropy.stats import poisson_conf_interval as pci
 import individual
+import dplint
 
 selnfiles = []
 
@@ -413,9 +414,7 @@ def global_cumulative(ax, composite, mlim, color, **kwargs):
     # r = np.array([rhoqso(composite.log10phi, bf, mlim, x, fit='composite') for x in z])
     # ax.plot(z, r, color='k', zorder=7)
 
-    r = np.zeros((nsample, nzs))
-    for i, theta in enumerate(rsample):
-        r[i] = np.array([rhoqso(composite.log10phi, theta, mlim, x, fit='composite') for x in z])
+    r = dplint.density_grid(composite, rsample, z, -35.0, mlim) # cMpc^-3
 
     up = np.percentile(r, 15.87, axis=0)
     down = np.percentile(r, 84.13, axis=0)
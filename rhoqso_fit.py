@@ -8,6 +8,7 @@ mpl.rcParams['font.serif'] = 'cm'
 mpl.rcParams['font.size'] = '22'
 import matplotlib.pyplot as plt
 import fit_emissivity
+import dplint
 
 def luminosity(M):
 
@@ -19,6 +20,11 @@ def rhoqso(loglf, theta, mlim, mbright=-23.0):
 
     """
 
+    params = dplint.dplparams(loglf, theta, None)
+    if params is not None:
+        # Exact; see dplint.
+        return dplint.luminosity_density(mbright, mlim, *params) # ergs s^-1 Hz^-1 cMpc^-3
+
     m = np.linspace(mbright, mlim, num=100)
     farr = np.array([(10.0**loglf(theta, x))*luminosity(x) for x in m])
     
@@ -47,6 +53,12 @@ def rhoqso_912(loglf, theta, mlim, mbright=-30.0):
 
     """
 
+    params = dplint.dplparams(loglf, theta, None)
+    if params is not None:
+        # Exact; see dplint.
+        return (dplint.luminosity_density(mbright, mlim, *params)
+                *((912.0/1450.0)**0.61)) # ergs s^-1 Hz^-1 cMpc^-3
+
     m = np.linspace(mbright, mlim, num=100)
     farr = np.array([10.0**loglf(theta, x)*luminosity(x)*((912.0/1450.0)**0.61) for x in m])
     
@@ -7,6 +7,7 @@ mpl.rcParams['font.serif'] = 'cm'
 mpl.rcParams['font.size'] = '22'
 import matplotlib.pyplot as plt
 from numpy.polynomial import Chebyshev as T
+import dpl
 
 p_log10phiStar = [-7.73388053, 1.06477161, -0.11304974]
 # p_MStar = [-17.84979944, -4.90153699, 0.49748768, -0.01925119]
@@ -37,9 +38,8 @@ def lfParams(z, pPhiStar, pMStar, pAlpha, pBeta):
 def phi(z, m, *params):
 
     log10phiStar, mStar, alpha, beta = lfParams(z, *params)
-    phi = 10.0**log10phiStar / (10.0**(0.4*(alpha+1)*(m-mStar)) +
-                                 10.0**(0.4*(beta+1)*(m-mStar)))
-    return phi
+
+    return dpl.phi(m, log10phiStar, mStar, alpha, beta)
 
 def dlfParamsdz(z, pPhiStar, pMStar, pAlpha, pBeta):
 
@@ -1,5 +1,6 @@
 import numpy as np
-from scipy.integrate import dblquad
+from scipy.special import gamma, gammaincc
+import dplint
 
 """ Functions for calculating the hydrogen photoionisation rate.
 
@@ -11,18 +12,28 @@ Bugs:
 
 -- Helium is ignored.  
 -- There are several magic numbers.  See function docstrings.
--- Code is too slow.   
 -- Module filename could be better.
 
-A note on the integrator used: scipy.integrate.dblquad dblquad uses
-qagse.f from FORTRAN QUADPACK.  qagse is an adaptive integrator for
-definite integrations.  It is an upgrage of qags.f, which, according
-to Wikipedia, "uses global adaptive quadrature based on 21-point
-Gauss-Kronrod quadrature within each subinterval, with acceleration by
-Peter Wynn's epsilon algorithm."
+A note on the opacity: the column density distribution f (below) is a
+power law in N_HI times a power law in 1+z, so the N_HI integral in
+tau_eff is done in closed form (incomplete gamma functions; see
+column_integral), and with y = ln(nu/nu_HI) the redshift integral
+becomes
+
+    tau_eff(nu0, z0, z) = C exp(-p (y0 - ln(1+z0))) (K(y) - K(y0)),
+
+where y0 and y are the rest-frame frequencies at z0 and z, p = 1 +
+beta_z, and K(y) = int_0^y exp(p y') I(y') dy' is one function of one
+variable.  K is tabulated once per process (opacity_table) and
+interpolated, so tau_eff broadcasts over all its arguments and j and
+gamma_HI evaluate whole frequency-redshift grids at once.  Before,
+tau_eff called scipy.integrate.dblquad for every (nu0, z0, z).
 
 """
 
+# Parameters of the column density distribution f.
+CDDF = {'A': 0.93, 'beta_N': 1.33, 'beta_z': 1.92, 'N_LL': 10.0**17.2}
+
 def f(N_HI, z):
 
     """
@@ -32,10 +43,10 @@ def f(N_HI, z):
 
     """
 
-    A = 0.93
-    beta_N = 1.33
-    beta_z = 1.92
-    N_LL = 10.0**17.2 # cm^-2 
+    A = CDDF['A']
+    beta_N = CDDF['beta_N']
+    beta_z = CDDF['beta_z']
+    N_LL = CDDF['N_LL'] # cm^-2 
 
     return (A/N_LL) * ((N_HI/N_LL)**(-beta_N)) * (((1.0+z)/4.5)**beta_z) # cm^2 
 
@@ -45,48 +56,110 @@ def sigma_HI(nu):
 
     This parameterisation is taken from Osterbrock and Ferland 2006
     (Sausalito, California: University Science Books), Equation (2.4).
+    nu can be an array.
 
     """
     
     nu0 = 3.288e15 # threshold freq for H I ionization; s^-1 (Hz)        
     a0 = 6.3e-18 # cm^2
 
-    if nu < nu0:
-        return 0.0
-    elif nu/nu0-1.0 == 0.0:
-        return a0*(nu0/nu)**4
-    else:
-        eps = np.sqrt(nu/nu0-1.0)
-        return (a0 * (nu0/nu)**4 * np.exp(4.0-4.0*np.arctan(eps)/eps) /
-                (1.0-np.exp(-2.0*np.pi/eps)))
+    x = np.asarray(nu, dtype=float)/nu0
+    eps = np.sqrt(np.maximum(x-1.0, 0.0))
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        s = np.where(eps == 0.0, a0*x**-4,
+                     (a0 * x**-4 * np.exp(4.0-4.0*np.arctan(eps)/eps) /
+                      (1.0-np.exp(-2.0*np.pi/eps))))
+
+    return np.where(x < 1.0, 0.0, s)[()]
+
+def column_integral(sigma, N_HI_min=1.0e13, N_HI_max=1.0e22):
+
+    """Integral of f(N_HI, z) (1 - exp(-sigma N_HI)) dN_HI / f_z(z).
+
+    f_z = A ((1+z)/4.5)^beta_z is the redshift part of f.  With x =
+    N_HI/N_LL, s = sigma N_LL and a = 1 - beta_N this is
+
+        int x^-beta_N (1 - exp(-s x)) dx
+          = [x^a/a] - s^-a [Gamma(a, s x_min) - Gamma(a, s x_max)],
+
+    where Gamma(a, t) for a < 0 follows from Gamma(a+1, t) by
+    recursion.  sigma can be an array.
+
+    """
+
+    beta_N = CDDF['beta_N']
+    a = 1.0 - beta_N
+    x1 = N_HI_min/CDDF['N_LL']
+    x2 = N_HI_max/CDDF['N_LL']
+    s = np.asarray(sigma, dtype=float)*CDDF['N_LL']
+
+    def upper_gamma(t):
+        # Gamma(a, t) = (Gamma(a+1, t) - t^a exp(-t))/a.
+        return (gamma(a+1.0)*gammaincc(a+1.0, t) - t**a*np.exp(-t))/a
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        r = ((x2**a - x1**a)/a
+             - s**-a*(upper_gamma(s*x1) - upper_gamma(s*x2)))
+
+    return np.where(s > 0.0, r, 0.0)[()]
+
+# Tabulation of K(y) for tau_eff, filled by opacity_table.
+_table = {}
+
+def opacity_table(ymax, dy=1.0e-3):
+
+    """Grid y and K(y) = int_0^y exp(p y') I(y') dy' up to at least ymax.
+
+    I(y) is column_integral at frequency nu_HI exp(y).  The table is
+    made on first use and extended when a larger ymax is asked for.
+
+    """
+
+    if _table.get('ymax', -1.0) < ymax:
+
+        nu_HI = 3.288e15 # Hz
+        p = 1.0 + CDDF['beta_z']
+
+        # Round up, so that the table is not remade for every
+        # slightly larger ymax.
+        top = max(np.ceil(ymax), 1.0)
+        y = np.linspace(0.0, top, num=int(round(top/dy))+1)
+        i = np.exp(p*y)*column_integral(sigma_HI(nu_HI*np.exp(y)))
+
+        K = np.zeros(y.size)
+        K[1:] = np.cumsum(0.5*(i[1:] + i[:-1])*np.diff(y))
+
+        _table.update(ymax=top, y=y, K=K)
+
+    return _table['y'], _table['K']
 
 def tau_eff(nu0, z0, z):
 
     """Calculate the effective opacity between redshifts z0 and z.
 
-    There are two magic numbers: N_HI_min, N_HI_max.  These should
-    ideally be 0 and infinity, but I have chosen to avoid improper
-    integrals here.
+    There are two magic numbers: N_HI_min, N_HI_max (1e13 and 1e22
+    cm^-2; see column_integral).  These should ideally be 0 and
+    infinity, but I have chosen to avoid improper integrals here.
+    nu0, z0 and z broadcast against each other.
 
     """
-    
-    N_HI_min = 1.0e13
-    N_HI_max = 1.0e22 
-    
-    def integrand(logN_HI, z):
 
-        N_HI = np.exp(logN_HI)
-        nu = nu0*(1.0+z)/(1.0+z0) 
-        tau = sigma_HI(nu)*N_HI 
+    nu_HI = 3.288e15 # Hz
+    p = 1.0 + CDDF['beta_z']
+    C = CDDF['A']*4.5**-CDDF['beta_z']
 
-        i = N_HI * f(N_HI, z) * (1.0-np.exp(-tau))
+    # Rest-frame frequencies at z0 and at z, as ln(nu/nu_HI).
+    y0 = np.log(np.asarray(nu0, dtype=float)/nu_HI)
+    y = y0 + np.log((1.0+np.asarray(z, dtype=float))/(1.0+np.asarray(z0, dtype=float)))
 
-        return i 
+    ys, K = opacity_table(np.max(np.maximum(y0, y)))
 
-    r = dblquad(integrand, z0, z, lambda x: np.log(N_HI_min),
-                lambda x: np.log(N_HI_max))
-    
-    return r[0] # dimensionless 
+    # K vanishes below the ionisation threshold (y < 0).
+    r = np.interp(y, ys, K, left=0.0) - np.interp(y0, ys, K, left=0.0)
+    r *= C*np.exp(-p*(y0 - np.log1p(z0)))
+
+    return r[()] # dimensionless 
 
 def H(z):
 
@@ -141,10 +214,21 @@ def emissivity(nu, z, loglf, theta, individual=False):
     """
 
     mlims = (-30.0, -20.0)
-    m = np.linspace(mlims[0], mlims[1], num=1000)
-    farr = emissivity_integrand(nu, z, loglf, theta, m, individual=individual)
 
-    e = np.trapz(farr, m) # erg s^-1 Hz^-1 cMpc^-3
+    params = dplint.dplparams(loglf, theta, z)
+    if params is not None:
+        # Exact; see dplint.  The spectrum does not depend on M.
+        c = 2.998e10 # cm s^-1  
+        l = c*1.0e8/nu # Angstrom
+        e = (dplint.luminosity_density(mlims[0], mlims[1], *params)
+             *((l/1450.0)**0.61)) # erg s^-1 Hz^-1 cMpc^-3
+    else:
+        m = np.linspace(mlims[0], mlims[1], num=1000)
+        nu, z = np.broadcast_arrays(nu, z)
+        farr = [emissivity_integrand(n, r, loglf, theta, m, individual=individual)
+                for n, r in zip(nu.flat, z.flat)]
+
+        e = np.trapz(farr, m, axis=-1).reshape(nu.shape)[()] # erg s^-1 Hz^-1 cMpc^-3
     e *= (1.0+z)**3 # erg s^-1 Hz^-1 pMpc^-3
 
     return e # erg s^-1 Hz^-1 pMpc^-3
@@ -154,28 +238,26 @@ def j(nu0, z0, *args, **kwargs):
     """Calculate the specific intensity at frequency nu0 and redshift z0.
 
     Two magic numbers: zmax and dz, which can affect the result.  args
-    and kwargs are passed on to the emissivity() function above.
+    and kwargs are passed on to the emissivity() function above.  nu0
+    can be an array; all frequencies and redshifts are done at once.
 
     """
 
     zmax = 6.6
     dz = 0.1
     
-    def integrand(z, *args, **kwargs):
-
-        nu = nu0*(1.0+z)/(1.0+z0)
-        
-        return (dlbydz(z)*vscale(z0,z)*emissivity(nu, z, *args, **kwargs)
-                *np.exp(-tau_eff(nu0, z0, z))) # erg s^-1 Mpc^-2 Hz^-1
-
     rs = np.arange(z0, zmax, dz)
+    nu0 = np.asarray(nu0, dtype=float)[..., np.newaxis]
+    nu = nu0*(1.0+rs)/(1.0+z0)
+
     # j has units of erg s^-1 Mpc^-2 Hz^-1.
-    j = np.array([integrand(r, *args, **kwargs) for r in rs])
+    j = (dlbydz(rs)*vscale(z0,rs)*emissivity(nu, rs, *args, **kwargs)
+         *np.exp(-tau_eff(nu0, z0, rs)))
     
-    r = np.trapz(j, x=rs) # erg s^-1 Mpc^-2 Hz^-1 
+    r = np.trapz(j, x=rs, axis=-1) # erg s^-1 Mpc^-2 Hz^-1 
     r /= (4.0*np.pi) # erg s^-1 Mpc^-2 Hz^-1 sr^-1  
     
-    return r # erg s^-1 Mpc^-2 Hz^-1 sr^-1  
+    return r[()] # erg s^-1 Mpc^-2 Hz^-1 sr^-1  
 
 def gamma_HI(z, *args, **kwargs):
 
@@ -196,20 +278,43 @@ def gamma_HI(z, *args, **kwargs):
     dnu=0.1
     lognu = np.arange(lognu_min, lognu_max, dnu)
 
-    def integrand(lognu, *args, **kwargs):
-
-        nu = np.exp(lognu) # Hz 
-        hplanck = 6.626069e-34 # Js
-        cmbympc = 3.24077928965e-25
-        # Note the additional factor of nu because the integral is
-        # going to be over log(nu).  This also reflects in the units.
-        return (nu * j(nu, z, *args, **kwargs) * sigma_HI(nu) *
-                cmbympc**2 / (hplanck * 1.0e7 * nu)) # s^-1 sr^-1 Hz^-1 Hz 
+    nu = np.exp(lognu) # Hz 
+    hplanck = 6.626069e-34 # Js
+    cmbympc = 3.24077928965e-25
+    # Note the additional factor of nu because the integral is going
+    # to be over log(nu).  This also reflects in the units.
+    g = (nu * j(nu, z, *args, **kwargs) * sigma_HI(nu) *
+         cmbympc**2 / (hplanck * 1.0e7 * nu)) # s^-1 sr^-1 Hz^-1 Hz 
 
-    g = np.array([integrand(n, *args, **kwargs) for n in lognu]) # s^-1 sr^-1 
     r = np.trapz(g, x=lognu) # s^-1 sr^-1 
     r *= 4.0*np.pi # s^-1
 
     return r # s^-1 
 
+if __name__ == '__main__':
+
+    import time
+    from scipy.integrate import dblquad
+
+    # Compare tau_eff with the direct double integral used before.
+    def tau_dblquad(nu0, z0, z):
+        def integrand(logN_HI, z):
+            N_HI = np.exp(logN_HI)
+            nu = nu0*(1.0+z)/(1.0+z0)
+            return N_HI*f(N_HI, z)*(1.0-np.exp(-sigma_HI(nu)*N_HI))
+        return dblquad(integrand, z0, z, lambda x: np.log(1.0e13),
+                       lambda x: np.log(1.0e22))[0]
+
+    cases = [(3.288e15, 2.0, 2.5), (3.288e15, 3.0, 4.0), (1.0e16, 4.0, 6.0),
+             (3.0e16, 1.0, 5.0), (1.0e17, 0.5, 6.5), (1.0e18, 5.0, 6.6)]
+
+    t0 = time.time()
+    direct = np.array([tau_dblquad(*c) for c in cases])
+    t_direct = time.time() - t0
+
+    t0 = time.time()
+    table = np.array([tau_eff(*c) for c in cases])
+    t_table = time.time() - t0
 
+    print('dblquad: {:.3g} s, table: {:.3g} s'.format(t_direct, t_table))
+    print('max relative difference: {:.2e}'.format(np.max(np.abs(table/direct - 1.0))))
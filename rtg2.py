@@ -10,6 +10,7 @@ from scipy.integrate import quad
 from scipy.interpolate import RectBivariateSpline
 import sys
 import gammapi
+import dplint
 from gammapi import get_gammapi_percentiles
 import matplotlib.patches as mpatches
 import matplotlib.ticker as ticker
@@ -370,9 +371,21 @@ vfnu_faint = np.vectorize(fnu_faint, otypes=[np.float])
 
 def emissivity(w, z, loglf, theta, mbright=-30, mfaint=-18):
 
-    m = np.linspace(mbright, mfaint, num=100)
     nu = c_angPerSec/w
 
+    params = dplint.dplparams(loglf, theta, z)
+    if params is not None:
+        # Exact; see dplint.  The spectrum fnu/L changes at M = -23.
+        bright = dplint.luminosity_density(min(mbright, -23.0),
+                                           min(mfaint, -23.0), *params)
+        faint = dplint.luminosity_density(max(mbright, -23.0),
+                                          max(mfaint, -23.0), *params)
+        sed_bright = vfnu(nu, -30.0)/luminosity(-30.0)
+        sed_faint = vfnu(nu, -18.0)/luminosity(-18.0)
+        return sed_bright*bright + sed_faint*faint # erg s^-1 Hz^-1 Mpc^-3
+
+    m = np.linspace(mbright, mfaint, num=100)
+
     farr = np.array([10.0**loglf(theta, x, z)*vfnu(nu, x) for x in m])
 
     return np.trapz(farr, m, axis=0) # erg s^-1 Hz^-1 Mpc^-3
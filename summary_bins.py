@@ -1,4 +1,6 @@
 import numpy as np
+import results
+import paramz
 import matplotlib as mpl
 mpl.use('Agg') 
 mpl.rcParams['text.usetex'] = True 
@@ -55,7 +57,7 @@ def getParam(individuals, param, which='old', dtype='good'):
 
     else:
 
-        zmean, zl, zu, u, l, c = np.loadtxt('bins.dat', usecols=(0,1,2,3+param*3,4+param*3,5+param*3), unpack=True)
+        zmean, zl, zu, u, l, c = results.getparam('bins', param)
 
     m = np.ones_like(zmean, dtype=bool)
     m[reject] = False
@@ -88,11 +90,8 @@ def plot_phi_star(fig, composite, individuals=None, compOpt=None, sample=False):
     if composite is not None: 
         bf = np.median(composite.samples, axis=0)
         if sample:
-            for theta in composite.samples[np.random.randint(len(composite.samples),
-                                                             size=900)]:
-                params = composite.getparams(theta)
-                phi = composite.atz(z, params[0]) 
-                ax.plot(z, phi, color=colors[0], alpha=0.02, zorder=1) 
+            values = paramz.posterior(composite, z, nsample=900)
+            ax.plot(z, values[0].T, color=colors[0], alpha=0.02, zorder=1)
         phi = composite.atz(z, composite.getparams(bf)[0])
         ax.plot(z, phi, color='k', zorder=2, lw=2)
 
@@ -189,11 +188,8 @@ def plot_m_star(fig, composite, individuals=None, compOpt=None, sample=False):
     if composite is not None:
         bf = np.median(composite.samples, axis=0)
         if sample:
-            for theta in composite.samples[np.random.randint(
-                    len(composite.samples), size=900)]:
-                params = composite.getparams(theta) 
-                M = composite.atz(z, params[1]) 
-                ax.plot(z, M, color='darkgrey', zorder=1)
+            values = paramz.posterior(composite, z, nsample=900)
+            ax.plot(z, values[1].T, color='darkgrey', zorder=1)
         M = composite.atz(z, composite.getparams(bf)[1])
         ax.plot(z, M, color='k', zorder=2, lw=2)
 
@@ -296,11 +292,8 @@ def plot_alpha(fig, composite, individuals=None, compOpt=None, sample=False):
     if composite is not None:
         bf = np.median(composite.samples, axis=0)
         if sample:
-            for theta in composite.samples[np.random.randint(
-                    len(composite.samples), size=900)]:
-                params = composite.getparams(theta)
-                alpha = composite.atz(z, params[2])
-                ax.plot(z, alpha, color=colors[2], alpha=0.02, zorder=1) 
+            values = paramz.posterior(composite, z, nsample=900)
+            ax.plot(z, values[2].T, color=colors[2], alpha=0.02, zorder=1)
         alpha = composite.atz(z, composite.getparams(bf)[2])
         ax.plot(z, alpha, color='k', zorder=2, lw=2)
 
@@ -393,11 +386,8 @@ def plot_beta(fig, composite, individuals=None, compOpt=None, sample=False):
     if composite is not None:
         bf = np.median(composite.samples, axis=0)
         if sample: 
-            for theta in composite.samples[np.random.randint(
-                    len(composite.samples), size=900)]:
-                params = composite.getparams(theta)
-                beta = composite.atz_beta(z, params[3]) 
-                ax.plot(z, beta, color=colors[3], alpha=0.02, zorder=1) 
+            values = paramz.posterior(composite, z, nsample=900)
+            ax.plot(z, values[3].T, color=colors[3], alpha=0.02, zorder=1)
         beta = composite.atz_beta(z, composite.getparams(bf)[3])
         ax.plot(z, beta, color='k', zorder=2, lw=2)
 
@@ -1,4 +1,5 @@
 import numpy as np
+import paramz
 import matplotlib as mpl
 mpl.use('Agg') 
 mpl.rcParams['text.usetex'] = True 
@@ -32,10 +33,8 @@ def plot_phi_star(fig, composite, sample=False, lfs=None, lfsMock=None):
     if composite is not None: 
         bf = np.mean(composite.samples, axis=0)
         if sample:
-            for theta in composite.samples[np.random.randint(len(composite.samples),
-                                                             size=500)]:
-                params = composite.getparams(theta)
-                phi = composite.atz(z, params[0]) 
+            values = paramz.evaluate(composite, paramz.draws(composite, 500), z)
+            for phi in values[0]:
                 ax.plot(z, phi, color='k', alpha=0.02, zorder=1) 
         phi = composite.atz(z, composite.getparams(bf)[0])
         ax.plot(z, phi, color='k', zorder=2, lw=2, label=r'composite fit to $z > 3.7$ qsos')
@@ -136,9 +135,8 @@ def plot_m_star(fig, composite, sample=False, lfs=None, lfsMock=None):
     if composite is not None: 
         bf = np.mean(composite.samples, axis=0)
         if sample:
-            for theta in composite.samples[np.random.randint(len(composite.samples), size=500)]:
-                params = composite.getparams(theta) 
-                M = composite.atz(z, params[1]) 
+            values = paramz.evaluate(composite, paramz.draws(composite, 500), z)
+            for M in values[1]:
                 ax.plot(z, M, color='k', alpha=0.02, zorder=1)
         M = composite.atz(z, composite.getparams(bf)[1])
         ax.plot(z, M, color='k', zorder=2, lw=2)
@@ -234,9 +232,8 @@ def plot_alpha(fig, composite, sample=False, lfs=None, lfsMock=None):
     if composite is not None: 
         bf = np.mean(composite.samples, axis=0)
         if sample:
-            for theta in composite.samples[np.random.randint(len(composite.samples), size=500)]:
-                params = composite.getparams(theta)
-                alpha = composite.atz(z, params[2])
+            values = paramz.evaluate(composite, paramz.draws(composite, 500), z)
+            for alpha in values[2]:
                 ax.plot(z, alpha, color='k', alpha=0.02, zorder=1) 
         alpha = composite.atz(z, composite.getparams(bf)[2])
         ax.plot(z, alpha, color='k', zorder=2, lw=2)
@@ -340,9 +337,8 @@ def plot_beta(fig, composite, sample=False, lfs=None, lfsMock=None):
     if composite is not None: 
         bf = np.mean(composite.samples, axis=0)
         if sample: 
-            for theta in composite.samples[np.random.randint(len(composite.samples), size=500)]:
-                params = composite.getparams(theta)
-                beta = composite.atz(z, params[3]) 
+            values = paramz.evaluate(composite, paramz.draws(composite, 500), z)
+            for beta in values[3]:
                 ax.plot(z, beta, color='k', alpha=0.01, zorder=1) 
         beta = composite.atz(z, composite.getparams(bf)[3])
         ax.plot(z, beta, color='k', zorder=2, lw=2)
@@ -1,4 +1,6 @@
 import numpy as np
+import results
+import paramz
 import matplotlib as mpl
 mpl.use('Agg') 
 mpl.rcParams['text.usetex'] = True 
@@ -31,47 +33,22 @@ def plot_model(composite, param_number, ax):
     if param_number == 0:
         print('phi')
 
-    nsample = 10000
-    np.random.seed()
-    rsample = composite.samples[np.random.randint(len(composite.samples), size=nsample)]
-    nzs = len(z) 
-    beta = np.zeros((nsample, nzs))
-
-    for i, theta in enumerate(rsample):
-        params = composite.getparams(theta)
-        if param_number < 3: 
-            beta[i] = composite.atz(z, params[param_number])
-        else:
-            beta[i] = composite.atz_beta(z, params[3]) 
-
-    up = np.percentile(beta, 15.87, axis=0)
-    down = np.percentile(beta, 84.13, axis=0)
+    values = paramz.posterior(composite, z, nsample=10000)
+    up, beta, down = paramz.percentiles(values)[:, param_number]
     
     mf = ax.fill_between(z, down, y2=up, color='forestgreen', zorder=1, alpha=0.7)
 
-    beta = np.median(beta, axis=0)
     m, = ax.plot(z, beta, color='forestgreen', zorder=2, lw=1)
     
     return mf, m
 
 def plot_model_polyb(composite, param_number, ax):
 
-    nsample = 10000
-    np.random.seed()
-    rsample = composite.samples[np.random.randint(len(composite.samples), size=nsample)]
-    nzs = len(z) 
-    beta = np.zeros((nsample, nzs))
-
-    for i, theta in enumerate(rsample):
-        params = composite.getparams(theta)
-        beta[i] = composite.atz(z, params[param_number])
-
-    up = np.percentile(beta, 15.87, axis=0)
-    down = np.percentile(beta, 84.13, axis=0)
+    values = paramz.posterior(composite, z, nsample=10000)
+    up, beta, down = paramz.percentiles(values)[:, param_number]
     
     mf = ax.fill_between(z, down, y2=up, color='peru', zorder=1, alpha=0.7)
 
-    beta = np.median(beta, axis=0)
     m, = ax.plot(z, beta, color='brown', zorder=2, lw=1)
     
     return mf, m 
@@ -103,9 +80,7 @@ def getParam(individuals, param, which='old', dtype='good'):
 
     else:
 
-        zmean, zl, zu, u, l, c = np.loadtxt('bins.dat',
-                                            usecols=(0,1,2,3+param*3,4+param*3,5+param*3),
-                                            unpack=True)
+        zmean, zl, zu, u, l, c = results.getparam('bins', param)
 
     m = np.ones_like(zmean, dtype=bool)
     m[reject] = False
@@ -139,20 +114,10 @@ def plot_phi_star(fig, composite, individuals=None, compOpt=None, sample=False,
         bf = np.median(composite.samples, axis=0)
         if sample:
 
-            nsample = 1000
-            rsample = composite.samples[np.random.randint(len(composite.samples), size=nsample)]
-            nzs = len(z) 
-            phi = np.zeros((nsample, nzs))
-
-            for i, theta in enumerate(rsample):
-                params = composite.getparams(theta)
-                phi[i] = composite.atz(z, params[0]) 
-                
-            up = np.percentile(phi, 15.87, axis=0)
-            down = np.percentile(phi, 84.13, axis=0)
+            values = paramz.posterior(composite, z, nsample=1000)
+            up, phi, down = paramz.percentiles(values)[:, 0]
             ax.fill_between(z, down, y2=up, color='grey', zorder=5, alpha=0.7)
             
-        phi = np.median(phi, axis=0)
         ax.plot(z, phi, color='k', zorder=5, lw=1)
 
     if lfg_break is not None: 
@@ -252,20 +217,10 @@ def plot_m_star(fig, composite, individuals=None, compOpt=None, sample=False, lf
         bf = np.median(composite.samples, axis=0)
         if sample:
 
-            nsample = 1000
-            rsample = composite.samples[np.random.randint(len(composite.samples), size=nsample)]
-            nzs = len(z) 
-            M = np.zeros((nsample, nzs))
-
-            for i, theta in enumerate(rsample):
-                params = composite.getparams(theta)
-                M[i] = composite.atz(z, params[1]) 
-                
-            up = np.percentile(M, 15.87, axis=0)
-            down = np.percentile(M, 84.13, axis=0)
+            values = paramz.posterior(composite, z, nsample=1000)
+            up, M, down = paramz.percentiles(values)[:, 1]
             ax.fill_between(z, down, y2=up, color='grey', zorder=5, alpha=0.7)
             
-        M = np.median(M, axis=0)
         ax.plot(z, M, color='k', zorder=5, lw=1)
 
     if lfg_break is not None: 
@@ -376,21 +331,11 @@ def plot_alpha(fig, composite, individuals=None, compOpt=None, sample=False, lfg
         bf = np.median(composite.samples, axis=0)
         if sample:
 
-            nsample = 1000
-            rsample = composite.samples[np.random.randint(len(composite.samples), size=nsample)]
-            nzs = len(z) 
-            alpha = np.zeros((nsample, nzs))
-
-            for i, theta in enumerate(rsample):
-                params = composite.getparams(theta)
-                alpha[i] = composite.atz(z, params[2]) 
-                
-            up = np.percentile(alpha, 15.87, axis=0)
-            down = np.percentile(alpha, 84.13, axis=0)
+            values = paramz.posterior(composite, z, nsample=1000)
+            up, alpha, down = paramz.percentiles(values)[:, 2]
             m1f = ax.fill_between(z, down, y2=up, color='grey', zorder=5, label='Model 1', alpha=0.7)
 
         
-        alpha = np.median(alpha, axis=0) 
         m1, = ax.plot(z, alpha, color='k', zorder=5, lw=1)
 
     if lfg_break is not None: 
@@ -512,25 +457,14 @@ def plot_beta(fig, composite, individuals=None, compOpt=None, sample=False, lfg_
         
         if sample:
 
-            nsample = 10000
-            np.random.seed()
-            rsample = composite.samples[np.random.randint(len(composite.samples), size=nsample)]
-            nzs = len(z) 
-            beta = np.zeros((nsample, nzs))
-
-            for i, theta in enumerate(rsample):
-                params = composite.getparams(theta)
-                beta[i] = composite.atz_beta(z, params[3]) 
-                
-            up = np.percentile(beta, 15.87, axis=0)
-            down = np.percentile(beta, 84.13, axis=0)
+            values = paramz.posterior(composite, z, nsample=10000)
+            up, beta, down = paramz.percentiles(values)[:, 3]
             ax.fill_between(z, down, y2=up, color='grey', zorder=5, alpha=0.7)
 
         # bfs = np.median(rsample, axis=0) 
         # print 'median beta (beta):', composite.getparams(bfs)[3]
         # print 'median beta (samples):', composite.getparams(bf)[3]
 
-        beta = np.median(beta, axis=0)
         ax.plot(z, beta, color='k', zorder=5, lw=1)
 
         # beta = composite.atz_beta(z, composite.getparams(bf)[3])
@@ -1,4 +1,5 @@
 import numpy as np
+import results
 import matplotlib as mpl
 mpl.use('Agg') 
 mpl.rcParams['text.usetex'] = True 
@@ -30,13 +31,9 @@ z = np.linspace(zmin, zmax, num=50)
 def getParam(param, dtype='notwithg'):
 
     if dtype=='withg':
-        zmean, zl, zu, u, l, c = np.loadtxt('bins_withg.dat',
-                                            usecols=(0,1,2,3+param*3,4+param*3,5+param*3),
-                                            unpack=True)
+        zmean, zl, zu, u, l, c = results.getparam('bins_withg', param)
     else:
-        zmean, zl, zu, u, l, c = np.loadtxt('bins.dat',
-                                            usecols=(0,1,2,3+param*3,4+param*3,5+param*3),
-                                            unpack=True)
+        zmean, zl, zu, u, l, c = results.getparam('bins', param)
     return zmean, zl, zu, u, l, c
 
 
@@ -1,4 +1,6 @@
 import numpy as np
+import results
+import paramz
 import matplotlib as mpl
 mpl.use('Agg') 
 mpl.rcParams['text.usetex'] = True 
@@ -71,47 +73,22 @@ def plot_model(composite, param_number, ax):
     if param_number == 0:
         print('phi')
 
-    nsample = 10000
-    np.random.seed()
-    rsample = composite.samples[np.random.randint(len(composite.samples), size=nsample)]
-    nzs = len(z) 
-    beta = np.zeros((nsample, nzs))
-
-    for i, theta in enumerate(rsample):
-        params = composite.getparams(theta)
-        if param_number < 3: 
-            beta[i] = composite.atz(z, params[param_number])
-        else:
-            beta[i] = composite.atz_beta(z, params[3]) 
-
-    up = np.percentile(beta, 15.87, axis=0)
-    down = np.percentile(beta, 84.13, axis=0)
+    values = paramz.posterior(composite, z, nsample=10000)
+    up, beta, down = paramz.percentiles(values)[:, param_number]
     
     ax.fill_between(z, down, y2=up, color='turquoise', zorder=1, label='Model 2')
 
-    beta = np.median(beta, axis=0)
     ax.plot(z, beta, color='turquoise', zorder=2, lw=1)
     
     return
 
 def plot_model_polyb(composite, param_number, ax):
 
-    nsample = 10000
-    np.random.seed()
-    rsample = composite.samples[np.random.randint(len(composite.samples), size=nsample)]
-    nzs = len(z) 
-    beta = np.zeros((nsample, nzs))
-
-    for i, theta in enumerate(rsample):
-        params = composite.getparams(theta)
-        beta[i] = composite.atz(z, params[param_number])
-
-    up = np.percentile(beta, 15.87, axis=0)
-    down = np.percentile(beta, 84.13, axis=0)
+    values = paramz.posterior(composite, z, nsample=10000)
+    up, beta, down = paramz.percentiles(values)[:, param_number]
     
     ax.fill_between(z, down, y2=up, color='peru', zorder=1, label='Model 3')
 
-    beta = np.median(beta, axis=0)
     ax.plot(z, beta, color='peru', zorder=2, lw=1)
     
     return
@@ -121,21 +98,15 @@ def getParam(individuals, param, which='old', dtype='good'):
 
     if which == 'nonUniformTiles':
 
-        zmean, zl, zu, u, l, c = np.loadtxt('bins_nonUniformTiles.dat',
-                                            usecols=(0,1,2,3+param*3,4+param*3,5+param*3),
-                                            unpack=True)
+        zmean, zl, zu, u, l, c = results.getparam('bins_nonUniformTiles', param)
 
     elif which == 'all2SLAQandSDSS':
 
-        zmean, zl, zu, u, l, c = np.loadtxt('bins_noExclusion2SLAQSDSS.dat',
-                                            usecols=(0,1,2,3+param*3,4+param*3,5+param*3),
-                                            unpack=True)
+        zmean, zl, zu, u, l, c = results.getparam('bins_noExclusion2SLAQSDSS', param)
 
     elif which == 'all2SLAQsomeSDSS':
 
-        zmean, zl, zu, u, l, c = np.loadtxt('bins_all2SLAQsomeSDSS.dat',
-                                            usecols=(0,1,2,3+param*3,4+param*3,5+param*3),
-                                            unpack=True)
+        zmean, zl, zu, u, l, c = results.getparam('bins_all2SLAQsomeSDSS', param)
         
     elif individuals is not None: 
     
@@ -162,9 +133,7 @@ def getParam(individuals, param, which='old', dtype='good'):
 
     else:
 
-        zmean, zl, zu, u, l, c = np.loadtxt('bins.dat',
-                                            usecols=(0,1,2,3+param*3,4+param*3,5+param*3),
-                                            unpack=True)
+        zmean, zl, zu, u, l, c = results.getparam('bins', param)
 
     m = np.ones_like(zmean, dtype=bool)
     m[reject] = False
@@ -198,20 +167,10 @@ def plot_phi_star(fig, composite, individuals=None, compOpt=None, sample=False,
         bf = np.median(composite.samples, axis=0)
         if sample:
 
-            nsample = 1000
-            rsample = composite.samples[np.random.randint(len(composite.samples), size=nsample)]
-            nzs = len(z) 
-            phi = np.zeros((nsample, nzs))
-
-            for i, theta in enumerate(rsample):
-                params = composite.getparams(theta)
-                phi[i] = composite.atz(z, params[0]) 
-                
-            up = np.percentile(phi, 15.87, axis=0)
-            down = np.percentile(phi, 84.13, axis=0)
+            values = paramz.posterior(composite, z, nsample=1000)
+            up, phi, down = paramz.percentiles(values)[:, 0]
             ax.fill_between(z, down, y2=up, color='grey', zorder=1)
             
-        phi = np.median(phi, axis=0)
         ax.plot(z, phi, color='k', zorder=2, lw=1)
 
 
@@ -376,20 +335,10 @@ def plot_m_star(fig, composite, individuals=None, compOpt=None, sample=False, lf
         bf = np.median(composite.samples, axis=0)
         if sample:
 
-            nsample = 1000
-            rsample = composite.samples[np.random.randint(len(composite.samples), size=nsample)]
-            nzs = len(z) 
-            M = np.zeros((nsample, nzs))
-
-            for i, theta in enumerate(rsample):
-                params = composite.getparams(theta)
-                M[i] = composite.atz(z, params[1]) 
-                
-            up = np.percentile(M, 15.87, axis=0)
-            down = np.percentile(M, 84.13, axis=0)
+            values = paramz.posterior(composite, z, nsample=1000)
+            up, M, down = paramz.percentiles(values)[:, 1]
             ax.fill_between(z, down, y2=up, color='grey', zorder=1)
             
-        M = np.median(M, axis=0)
         ax.plot(z, M, color='k', zorder=2, lw=1)
 
         
@@ -560,21 +509,11 @@ def plot_alpha(fig, composite, individuals=None, compOpt=None, sample=False, lfg
         bf = np.median(composite.samples, axis=0)
         if sample:
 
-            nsample = 1000
-            rsample = composite.samples[np.random.randint(len(composite.samples), size=nsample)]
-            nzs = len(z) 
-            alpha = np.zeros((nsample, nzs))
-
-            for i, theta in enumerate(rsample):
-                params = composite.getparams(theta)
-                alpha[i] = composite.atz(z, params[2]) 
-                
-            up = np.percentile(alpha, 15.87, axis=0)
-            down = np.percentile(alpha, 84.13, axis=0)
+            values = paramz.posterior(composite, z, nsample=1000)
+            up, alpha, down = paramz.percentiles(values)[:, 2]
             ax.fill_between(z, down, y2=up, color='grey', zorder=1, label='Model 1')
 
         
-        alpha = np.median(alpha, axis=0) 
         ax.plot(z, alpha, color='k', zorder=2, lw=1)
 
 
@@ -747,25 +686,14 @@ def plot_beta(fig, composite, individuals=None, compOpt=None, sample=False, lfg_
         
         if sample:
 
-            nsample = 10000
-            np.random.seed()
-            rsample = composite.samples[np.random.randint(len(composite.samples), size=nsample)]
-            nzs = len(z) 
-            beta = np.zeros((nsample, nzs))
-
-            for i, theta in enumerate(rsample):
-                params = composite.getparams(theta)
-                beta[i] = composite.atz_beta(z, params[3]) 
-                
-            up = np.percentile(beta, 15.87, axis=0)
-            down = np.percentile(beta, 84.13, axis=0)
+            values = paramz.posterior(composite, z, nsample=10000)
+            up, beta, down = paramz.percentiles(values)[:, 3]
             ax.fill_between(z, down, y2=up, color='grey', zorder=1)
 
         # bfs = np.median(rsample, axis=0) 
         # print 'median beta (beta):', composite.getparams(bfs)[3]
         # print 'median beta (samples):', composite.getparams(bf)[3]
 
-        beta = np.median(beta, axis=0)
         ax.plot(z, beta, color='k', zorder=2, lw=1)
 
         # beta = composite.atz_beta(z, composite.getparams(bf)[3])
@@ -0,0 +1,192 @@
+import itertools
+import numpy as np
+import emcee
+import importance
+
+"""
+
+Quick-look MCMC of a composite model on an emulated likelihood.
+
+Each evaluation of composite.lf.neglnlike passes over all quasars and
+selection-map tiles.  run fits instead a polynomial in the parameters
+(by default cubic, i.e. third-order polynomial chaos in whitened
+coordinates) to neglnlike at design points around the best fit, and
+runs the MCMC on
+
+    lnprob_emulated = lnprior - polynomial,
+
+which costs almost nothing per step.  The first design points are
+drawn from a Gaussian with the inverse Fisher matrix at the best fit
+as covariance, widened by `spread`, and restricted to the prior.  The
+polynomial is only trusted out to the largest whitened radius of its
+design points; beyond that lnprob_emulated is -inf, so that the
+walkers cannot run off where the polynomial decreases.
+
+The fit is then refined nrefine times: a short emulated MCMC is run,
+some of its samples are evaluated with the exact likelihood and added
+to the design, and the polynomial is refitted.  Points are weighted
+in the fit by how close their neglnlike is to the smallest one, so
+the fit is best where the posterior is.
+
+Finally the emulated posterior is corrected: nexact of its samples
+are evaluated with the exact lnprob, and their importance weights
+exact - emulated are returned as an importance.weights object.  Its
+ESS tells whether the quick look can be trusted; a small ESS means
+the emulator is poor over the posterior and a full run is needed.
+
+"""
+
+class polynomial:
+
+    """Polynomial of degree order in whitened parameters."""
+
+    def __init__(self, centre, cov, order=3):
+
+        self.centre = centre
+        self.order = order
+
+        # Whitening: u = W (theta - centre) has unit covariance.
+        self.whiten = np.linalg.inv(np.linalg.cholesky(cov))
+
+        ndim = centre.size
+        self.terms = [c for d in range(order+1)
+                      for c in itertools.combinations_with_replacement(range(ndim), d)]
+
+        return
+
+    def whitened(self, thetas):
+
+        return np.dot(np.atleast_2d(thetas) - self.centre, self.whiten.T)
+
+    def features(self, thetas):
+
+        u = self.whitened(thetas)
+
+        f = np.ones((len(u), len(self.terms)))
+        for j, c in enumerate(self.terms):
+            for k in c:
+                f[:, j] *= u[:, k]
+
+        return f
+
+    def fit(self, thetas, values, weights=None):
+
+        """Weighted least-squares fit to values at thetas.
+
+        Sets self.rms, the weighted rms residual, and self.radius, the
+        largest whitened radius of thetas.
+
+        """
+
+        if weights is None:
+            weights = np.ones(len(values))
+
+        f = self.features(thetas)
+        sw = np.sqrt(weights)
+        self.coeffs, res, rank, sv = np.linalg.lstsq(f*sw[:, None], values*sw,
+                                                     rcond=None)
+
+        residual = np.dot(f, self.coeffs) - values
+        self.rms = np.sqrt(np.average(residual**2, weights=weights))
+        self.radius = np.max(np.sqrt(np.sum(self.whitened(thetas)**2, axis=1)))
+
+        return
+
+    def inside(self, thetas):
+
+        """True for thetas within the region covered by the fit."""
+
+        return np.sqrt(np.sum(self.whitened(thetas)**2, axis=1)) <= self.radius
+
+    def __call__(self, thetas):
+
+        return np.dot(self.features(thetas), self.coeffs)
+
+def laplace_cov(lf, theta):
+
+    """Inverse Fisher matrix of lf at theta, with tiny eigenvalues clipped."""
+
+    fisher = lf.fisher(theta)
+    e, v = np.linalg.eigh(fisher)
+    e = np.maximum(e, 1.0e-10*e.max())
+
+    return np.dot(v/e, v.T)
+
+def design(lf, centre, cov, n, spread):
+
+    """n points from N(centre, spread^2 cov) inside the prior of lf."""
+
+    points = np.empty((0, centre.size))
+
+    for attempt in range(100):
+        x = np.random.multivariate_normal(centre, spread**2*cov, size=2*n)
+        ok = np.isfinite(importance.lnprior_batch(lf, x))
+        points = np.vstack([points, x[ok]])
+        if len(points) >= n:
+            return points[:n]
+
+    raise ValueError('too few design points inside the prior; '
+                     'is the best fit inside it?')
+
+def fit_weights(values, ndim):
+
+    """Fit weights of design points with neglnlike values."""
+
+    # Within the posterior, neglnlike - min is of order ndim/2; points
+    # far above that matter little and are hardest to fit.
+    d = (values - values.min())/ndim
+
+    return 1.0/(1.0 + d**2)
+
+def run(lf, num_runs=1000, order=3, ndesign=None, spread=1.0, nrefine=2,
+        nexact=2000, nwalkers=100):
+
+    """Emulate lf.neglnlike around lf.bf.x and sample the emulated posterior.
+
+    ndesign (default three times the number of polynomial terms) is
+    the number of initial design points; each refinement adds a third
+    as many.  Returns the emulator, the emulated chain (second half,
+    flattened) and the importance.weights of nexact of its samples for
+    the exact posterior.
+
+    """
+
+    centre = lf.bf.x
+    cov = laplace_cov(lf, centre)
+    ndim = centre.size
+
+    emulator = polynomial(centre, cov, order=order)
+    if ndesign is None:
+        ndesign = 3*len(emulator.terms)
+
+    x = design(lf, centre, cov, ndesign, spread)
+    y = lf.neglnlike_batch(x)
+
+    def lnprob(thetas):
+        lp = importance.lnprior_batch(lf, thetas)
+        result = np.full(len(thetas), -np.inf)
+        ok = np.isfinite(lp) & emulator.inside(thetas)
+        result[ok] = lp[ok] - emulator(thetas[ok])
+        return result
+
+    pos = centre + 1.0e-4*np.random.randn(nwalkers, ndim)
+
+    for step in range(nrefine+1):
+        ok = np.isfinite(y)
+        emulator.fit(x[ok], y[ok], fit_weights(y[ok], ndim))
+
+        sampler = emcee.EnsembleSampler(nwalkers, ndim, lnprob, vectorize=True)
+        sampler.run_mcmc(pos, num_runs)
+        pos = sampler.get_last_sample().coords
+        chain = sampler.get_chain(discard=num_runs//2, flat=True)
+
+        if step < nrefine:
+            new = chain[np.random.randint(len(chain), size=ndesign//3)]
+            x = np.vstack([x, new])
+            y = np.concatenate([y, lf.neglnlike_batch(new)])
+
+    draws = chain[np.random.randint(len(chain), size=nexact)]
+    logw = lf.lnprob_batch(draws) - lnprob(draws)
+    logw[np.isnan(logw)] = -np.inf
+
+    return emulator, chain, importance.weights(draws, logw)
@@ -0,0 +1,194 @@
+import os
+import collections
+import multiprocessing
+import numpy as np
+import chains
+
+"""
+
+Likelihood split by survey, and leave-one-survey-out jackknife.
+
+likelihood wraps an lf (individual.lf or composite.lf) and keeps, for
+each survey, the data and normalisation terms of its likelihood (see
+the survey_terms methods).  The terms of recently used thetas are
+kept in a small LRU cache, so a survey can be switched off or on and
+the likelihood at those thetas is then a sum over cached terms:
+
+    L = surveys.likelihood(lfg)
+    L.neglnlike(lfg.bf.x)               # evaluates all surveys
+    L.exclude(17)
+    L.neglnlike(lfg.bf.x)               # no new evaluation
+
+A theta that is not in the cache only evaluates the surveys that are
+switched on.  The terms use the unbinned quasars, so for a composite
+lf with binned=True the sum differs slightly from lf.neglnlike.
+
+jackknife refits the model once without each survey, in parallel
+worker processes, and returns the fits and a table of their results.
+
+"""
+
+class likelihood:
+
+    def __init__(self, lf, cache_size=16):
+
+        self.lf = lf
+        self.sids = np.unique(np.concatenate([lf.sid, lf.tile_sid]))
+        self.active = set(self.sids.tolist())
+        self.cache_size = cache_size
+
+        # theta.tobytes() -> {sid: (data, norm)}, least recently used
+        # first.
+        self.cache = collections.OrderedDict()
+
+        return
+
+    def include(self, sid):
+
+        self.active.add(sid)
+
+        return
+
+    def exclude(self, sid):
+
+        self.active.discard(sid)
+
+        return
+
+    def terms(self, theta):
+
+        """{sid: (data, norm)} for the surveys switched on, at theta."""
+
+        theta = np.asarray(theta, dtype=float)
+        key = theta.tobytes()
+
+        try:
+            cached = self.cache.pop(key)
+        except(KeyError):
+            cached = {}
+
+        missing = [s for s in sorted(self.active) if s not in cached]
+        if len(missing) > 0:
+            data, norm = self.lf.survey_terms(theta, missing)
+            for i, s in enumerate(missing):
+                cached[s] = (data[0, i], norm[0, i])
+
+        self.cache[key] = cached
+        while len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+
+        return {s: cached[s] for s in self.active}
+
+    def neglnlike(self, theta):
+
+        """neglnlike of the surveys switched on; see lf.neglnlike."""
+
+        t = self.terms(theta)
+
+        return sum([-2.0*data + 2.0*norm for data, norm in t.values()])
+
+    def lnprob(self, theta):
+
+        lp = self.lf.lnprior(theta)
+
+        if not np.isfinite(lp):
+            return -np.inf
+
+        return lp - self.neglnlike(theta)
+
+    def jackknife_neglnlike(self, theta):
+
+        """{sid: neglnlike without that survey} at theta."""
+
+        active = self.active
+        self.active = set(self.sids.tolist())
+        try:
+            t = self.terms(theta)
+        finally:
+            self.active = active
+
+        total = sum([-2.0*data + 2.0*norm for data, norm in t.values()])
+
+        return {s: total - (-2.0*data + 2.0*norm) for s, (data, norm) in t.items()}
+
+# Model and fit options of the current jackknife call, inherited by
+# its workers when they are forked.
+_shared = {}
+
+def _refit(sid):
+
+    lf = _shared['lf']
+    options = dict(_shared['options'])
+    method = options.pop('method')
+
+    model = lf.without_surveys([sid])
+    model.bestfit(lf.bf.x, method=method)
+    model.run_mcmc(**options)
+
+    # Send back the chain but not the sampler, which holds the pool
+    # and the log-probability function.
+    model.sampler = chains.in_memory(model.sampler)
+
+    return sid, model
+
+def jackknife(lf, sids=None, processes=None, method='L-BFGS-B', **options):
+
+    """Refit lf once without each survey in sids (default: all).
+
+    Each fit starts its optimiser at lf.bf.x and then runs
+    run_mcmc(**options); the fits run in up to `processes` worker
+    processes (None: one per survey, up to the number of CPUs).
+
+    Returns a dict {sid: fitted lf} and a structured array with, for
+    each omitted survey, its number of quasars, the best fit, the
+    shift of the median of each parameter from lf.samples in units of
+    its standard deviation, and the percentiles of each parameter.
+
+    """
+
+    if sids is None:
+        sids = likelihood(lf).sids.tolist()
+
+    for s in sids:
+        if np.all(lf.sid == s):
+            raise ValueError('survey {:g} holds all the quasars'.format(s))
+
+    if processes is None:
+        processes = min(len(sids), os.cpu_count())
+
+    _shared['lf'] = lf
+    _shared['options'] = dict(options, method=method)
+
+    try:
+        if processes == 1:
+            done = [_refit(s) for s in sids]
+        else:
+            context = multiprocessing.get_context('fork')
+            with context.Pool(processes) as pool:
+                done = list(pool.imap_unordered(_refit, sids, chunksize=1))
+    finally:
+        _shared.clear()
+
+    models = dict(done)
+
+    ndim = lf.bf.x.size
+    dtype = np.dtype([('sid', 'i8'),
+                      ('nqso', 'i8'),
+                      ('bestfit', 'f8', (ndim,)),
+                      ('shift', 'f8', (ndim,)),
+                      ('percentiles', 'f8', (ndim, 3))])
+    table = np.zeros(len(sids), dtype=dtype)
+
+    centre = np.median(lf.samples, axis=0)
+    sigma = np.std(lf.samples, axis=0)
+
+    for row, s in zip(table, sids):
+        model = models[s]
+        row['sid'] = s
+        row['nqso'] = np.sum(lf.sid == s)
+        row['bestfit'] = model.bf.x
+        row['shift'] = (np.median(model.samples, axis=0) - centre)/sigma
+        row['percentiles'] = np.percentile(model.samples, [15.87, 84.13, 50],
+                                           axis=0).T
+
+    return models, table
@@ -1,67 +1,177 @@
 import numpy as np
+from scipy.special import logsumexp
+
+"""
+
+Information criteria (WAIC and PSIS-LOO) of a fitted luminosity
+function model lf (individual.lf or composite.lf).
+
+The likelihood of one data point M (and z) is
+
+    p(M | theta) = phi(M; theta)/lfnorm(theta),
+
+which is similar to, e.g., Equation (21) of Fan et al. 2001 (ApJ 121
+54), but is different from the likelihood used in individual.py.
+That likelihood is Equation (20) of Fan et al. 2001.  The two
+likelihoods are related but this form is more useful here.
+
+loglike_matrix evaluates ln p for S posterior draws and all quasars
+at once, as an (S, nqso) array, with one lfnorm per draw (see the
+pointwise_lnlike methods).  waic and loo compute their criteria from
+that matrix:
+
+    waic.waic(lfi)
+    looic, khat = waic.loo(lfg)
+
+Both are on the deviance scale, so lower is better.  khat is the
+Pareto shape of each point's importance ratios; LOO is unreliable for
+points with khat > 0.7.
+
+"""
+
+def loglike_matrix(lf, S=100):
+    """
+    ln p(M_i | theta_s) for S draws theta_s from the posterior of lf
+    (all samples if S is None) and all quasars i.
 
-def ppost(lf, mag, theta):
     """
-    Likelihood of data point mag for model lf with parameters theta.
 
-    This likelihood is similar to, e.g., Equation (21) of Fan et
-    al. 2001 (ApJ 121 54), but is different from the likelihood used
-    in individual.py.  That likelihood is Equation (20) of Fan et
-    al. 2001.  The two likelihoods are related but the following form
-    is more useful for this application.
+    if S is None:
+        thetas = lf.samples
+    else:
+        thetas = lf.samples[np.random.randint(len(lf.samples), size=S)]
 
+    return lf.pointwise_lnlike(thetas)
+
+def waic_from_matrix(lnp):
     """
+    WAIC from an (S, nqso) matrix lnp of pointwise log likelihoods.
 
-    return 10.0**lf.log10phi(theta, mag)/lf.lfnorm(theta)
+    See page 173 of BDA3.
 
-def ppostdist(lf, mag, S=100): 
     """
-    Given a data point mag, return an array of probabilities under
-    model parameters sampled from the posterior.  See, e.g., Equation
-    (7.5) of BDA3.
 
-    S values are sampled from the posterior.
+    S = lnp.shape[0]
+
+    lppd = np.sum(logsumexp(lnp, axis=0) - np.log(S)) # Equation (7.5) of BDA3
+    p_waic_2 = np.sum(np.var(lnp, axis=0, ddof=1)) # Equation (7.12) of BDA3
+
+    return -2.0 * (lppd - p_waic_2)
 
+def waic(lf, S=100):
     """
-    
-    n = np.random.randint(len(lf.samples), size=S)
-    return(np.array([ppost(lf, mag, t) for t in lf.samples[n]]))
+    Calculate the Watanabe-Akaike Information Criterion (WAIC) for a
+    quasar luminosity model lf, from S posterior draws.
 
-def lnepost(lf, mag): 
     """
-    Given a data point mag, return two things:
 
-    (1) The logarithm of the expectation value of the model likelihood
-    of mag over the posterior distribution of theta, and 
+    return waic_from_matrix(loglike_matrix(lf, S))
 
-    (2) The variance of the logarithm of the model likelihood of mag
-    over the posterior distribution of theta. 
+def gpdfit(x):
+    """
+    Fit a generalised Pareto distribution to each row of x (sorted,
+    positive exceedances), by the method of Zhang & Stephens 2009
+    with the weak prior on k of Vehtari et al. 2017 (arXiv:1507.02646).
 
-    For (1), see Equation (7.4) of BDA3.  For (2), see discussion
-    above Equation 7.12 of BDA3.
+    Returns arrays k and sigma, one value per row.
 
     """
-    
-    p = ppostdist(lf, mag) 
-    lnp = np.log(np.mean(p))
-    var = np.var(np.log(p), ddof=1) 
 
-    return np.array([lnp, var])
+    n = x.shape[1]
+    m = 30 + int(np.sqrt(n))
+
+    b = 1.0 - np.sqrt(m/(np.arange(1, m+1) - 0.5)) # (m,)
+    b = b/(3.0*x[:, int(n/4.0 + 0.5) - 1, np.newaxis]) + 1.0/x[:, -1:] # (rows, m)
+
+    k = np.mean(np.log1p(-b[:, :, np.newaxis]*x[:, np.newaxis, :]), axis=2)
+    L = n*(np.log(-b/k) - k - 1.0)
+
+    # Posterior weights of the candidate b.
+    w = 1.0/np.sum(np.exp(L[:, np.newaxis, :] - L[:, :, np.newaxis]), axis=2)
+    w[w < 10.0*np.finfo(float).eps] = 0.0
+    w /= np.sum(w, axis=1, keepdims=True)
+
+    b = np.sum(b*w, axis=1, keepdims=True)
+    k = np.mean(np.log1p(-b*x), axis=1)
+    sigma = -k/b[:, 0]
+
+    # Shrink towards k = 0.5 (a prior worth 10 observations).
+    k = (n*k + 10.0*0.5)/(n + 10.0)
 
-def waic(lf):
+    return k, sigma
+
+def psis(lw, rows=200):
     """
-    Calculate the Watanabe-Akaike Information Criterion (WAIC) for a
-    quasar luminosity model lf (defined in individual.py).
+    Pareto-smoothed importance sampling of the log weights lw, an (S,
+    npoints) array with one column of weights per point.
 
-    See page 173 of BDA3. 
+    Returns the smoothed log weights, normalised in each column, and
+    the Pareto shape khat of each column.  The Pareto fits are done
+    rows columns at a time.
 
     """
 
-    p = np.array([lnepost(lf, m) for m in lf.M1450])
+    S, npoints = lw.shape
+    lw = lw - np.max(lw, axis=0)
 
-    lppd = np.sum(p[:,0]) # Equation (7.5) of BDA3 
-    p_waic_2 = np.sum(p[:,1]) # Equation (7.12) of BDA3 
+    # Number of draws in the tail.
+    M = int(np.ceil(min(0.2*S, 3.0*np.sqrt(S))))
 
-    return -2.0 * (lppd - p_waic_2)
-    
+    order = np.argsort(lw, axis=0)
+    tail = order[-M:]
+    cutoff = np.take_along_axis(lw, order[-M-1:-M], axis=0) # (1, npoints)
+
+    x = np.take_along_axis(lw, tail, axis=0).T # (npoints, M), ascending
+    x = np.exp(x) - np.exp(cutoff.T)
+
+    khat = np.empty(npoints)
+    sigma = np.empty(npoints)
+    for i in range(0, npoints, rows):
+        khat[i:i+rows], sigma[i:i+rows] = gpdfit(x[i:i+rows])
+
+    # Replace the tail weights by the expected order statistics of the
+    # fitted distribution.
+    p = (np.arange(M) + 0.5)/M
+    k = khat[:, np.newaxis]
+    s = sigma[:, np.newaxis]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        q = np.where(np.abs(k) < 1.0e-12,
+                     -s*np.log1p(-p),
+                     s*np.expm1(-k*np.log1p(-p))/k)
+    smoothed = np.log(q + np.exp(cutoff.T))
+
+    # Columns whose fit failed keep their raw weights.
+    ok = np.all(np.isfinite(smoothed), axis=1)
+    smoothed[~ok] = np.log(x[~ok] + np.exp(cutoff.T[~ok]))
+
+    lw = lw.copy()
+    np.put_along_axis(lw, tail, smoothed.T, axis=0)
+
+    # Truncate at the largest raw weight.
+    lw = np.minimum(lw, 0.0)
+
+    return lw - logsumexp(lw, axis=0), khat
+
+def loo_from_matrix(lnp):
+    """
+    PSIS-LOO information criterion from an (S, nqso) matrix lnp of
+    pointwise log likelihoods, and the Pareto shape of each quasar.
+
+    See Vehtari, Gelman & Gabry 2017 (Stat. Comput. 27, 1413).
+
+    """
+
+    # The importance ratios for leaving out point i are 1/p(M_i | theta).
+    lw, khat = psis(-lnp)
+    elpd_loo = np.sum(logsumexp(lw + lnp, axis=0))
+
+    return -2.0 * elpd_loo, khat
+
+def loo(lf, S=1000):
+    """
+    Calculate the PSIS-LOO information criterion for a quasar
+    luminosity model lf, from S posterior draws.
+
+    """
 
+    return loo_from_matrix(loglike_matrix(lf, S))